@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Written by Lucas Sinclair and Paul Rougieux.
+
+JRC Biomass Project.
+Unit D1 Bioeconomy.
+
+The command line interface of `libcbm_runner`, installed as the
+`libcbm-runner` executable. For instance:
+
+    $ libcbm-runner run --combo historical --countries LU,FR --jobs 4 --max-mem 16G
+
+Every runner is run in its own process, at most `--jobs` at the same time,
+and each process can be limited in memory with `--max-mem`. A runner that
+crashes or is killed only fails on its own. A line is printed every time a
+runner finishes. The exit status is non-zero if any runner failed.
+
+Note that `--max-mem` caps the virtual memory of a runner, i.e. its address
+space, not the memory it actually uses. Libraries such as numpy, BLAS and
+the allocator reserve much more address space than they touch, so the
+limit should be set well above the resident memory a runner is expected
+to use, typically two to three times. It is ignored on systems without
+the `resource` module, such as Windows.
+"""
+
+# Built-in modules #
+import sys, time, argparse, multiprocessing
+from multiprocessing.connection import wait
+
+# Third party modules #
+
+# First party modules #
+
+# Internal modules #
+from libcbm_runner.core.pool import run_runner
+
+# Suffixes accepted for memory sizes #
+units = {'K': 1024, 'M': 1024**2, 'G': 1024**3, 'T': 1024**4}
+
+###############################################################################
+def parse_memory(text):
+    """Convert a size such as '16G' or '512M' to a number of bytes."""
+    text = text.strip().upper().rstrip('B')
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+def limit_memory(max_mem):
+    """
+    Executed at the start of every job process. Limits the address space
+    of the process, so that a runner using too much memory fails on its
+    own with a `MemoryError` instead of bringing down the whole machine.
+    This is a limit on virtual memory, which is larger than the resident
+    memory.
+    """
+    if max_mem is None: return
+    try: import resource
+    except ImportError:
+        print("Cannot limit the memory on this system.", file=sys.stderr)
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    resource.setrlimit(resource.RLIMIT_AS, (max_mem, hard))
+
+def run_job(task, max_mem):
+    """
+    Executed in a new process for every runner, so that the memory limit
+    applies to that runner only. The exit code is 1 if the runner failed.
+    """
+    limit_memory(max_mem)
+    error = run_runner(task)[2]
+    sys.exit(1 if error else 0)
+
+###############################################################################
+def make_parser():
+    """Build the parser of the command line arguments."""
+    description = "Run carbon budget simulations with libcbm."
+    parser = argparse.ArgumentParser(prog='libcbm-runner',
+                                     description=description)
+    commands = parser.add_subparsers(dest='command', required=True)
+    # The run command #
+    run = commands.add_parser('run', help="Run the runners of a combo.")
+    run.add_argument('--combo', required=True,
+                     help="The short name of the combo, e.g. 'historical'.")
+    run.add_argument('--countries', default=None,
+                     help="Comma separated iso2 codes, all by default.")
+    run.add_argument('--step', type=int, default=-1,
+                     help="The step of the runners, the last by default.")
+    run.add_argument('--jobs', type=int, default=1,
+                     help="How many runners to run at the same time.")
+    run.add_argument('--max-mem', type=parse_memory, default=None,
+                     help="The virtual memory limit of each runner, e.g. "
+                          "'16G'. Reserved address space counts, so set it "
+                          "well above the expected resident memory.")
+    run.add_argument('--resume', action='store_true',
+                     help="Skip runners that are already up-to-date.")
+    run.add_argument('--quiet', action='store_true',
+                     help="Only print one line per runner.")
+    # Return #
+    return parser
+
+def run(args):
+    """Run the runners asked for and return the exit status."""
+    # Import here so that `--help` stays fast #
+    from libcbm_runner.core.continent import continent
+    # Resolve the combo #
+    if args.combo not in continent.combos:
+        msg = "Unknown combo '%s', choose from: %s."
+        sys.exit(msg % (args.combo, ', '.join(sorted(continent.combos))))
+    combo = continent.combos[args.combo]
+    # Resolve the countries #
+    if args.countries is None: codes = list(combo.runners)
+    else: codes = [c.strip() for c in args.countries.split(',') if c.strip()]
+    unknown = [c for c in codes if c not in combo.runners]
+    if unknown: sys.exit("Unknown countries: %s." % ', '.join(unknown))
+    # Skip the runners that are up-to-date #
+    items = [(code, combo.runners[code]) for code in codes]
+    if args.resume: items = combo.stale_runners(items, args.step)
+    if not items: return 0
+    # The tasks only contain names, each job finds its own runner #
+    kwargs = {'verbose': not args.quiet}
+    tasks  = {code: (args.combo, code, args.step, kwargs)
+              for code, steps in items}
+    # Run the jobs, one process per runner #
+    failed  = []
+    start   = time.time()
+    pending = list(tasks.items())
+    running = {}
+    done    = 0
+    while pending or running:
+        # Start processes until all job slots are taken #
+        while pending and len(running) < args.jobs:
+            code, task = pending.pop(0)
+            process = multiprocessing.Process(target = run_job,
+                                              args   = (task, args.max_mem),
+                                              name   = code)
+            process.start()
+            running[code] = process
+        # Wait for at least one to end #
+        wait([process.sentinel for process in running.values()])
+        for code, process in list(running.items()):
+            if process.is_alive(): continue
+            process.join()
+            del running[code]
+            # A negative exit code is a signal, such as an OOM kill #
+            error = process.exitcode != 0
+            if process.exitcode < 0:
+                msg = "%s was killed by signal %i"
+                print(msg % (code, -process.exitcode), file=sys.stderr)
+            if error: failed.append(code)
+            done   += 1
+            status  = "failed" if error else "done"
+            elapsed = time.time() - start
+            msg = "[%i/%i] %s %s (%.0f seconds elapsed)"
+            print(msg % (done, len(tasks), code, status, elapsed), flush=True)
+    # Summary #
+    if failed:
+        print("%i runners failed: %s" % (len(failed), ', '.join(failed)),
+              file=sys.stderr)
+        return 1
+    return 0
+
+def main(argv=None):
+    """The entry point of the `libcbm-runner` executable."""
+    args = make_parser().parse_args(argv)
+    if args.command == 'run': return run(args)
+
+###############################################################################
+if __name__ == '__main__': sys.exit(main())
@@ -12,6 +12,7 @@ Unit D1 Bioeconomy.
 import textwrap
 
 # Third party modules #
+import pandas
 from p_tqdm import p_umap, t_map
 
 # First party modules #
@@ -20,7 +21,12 @@ from plumbing.cache import property_cached
 from plumbing.timer import Timer
 
 # Internal modules #
-from libcbm_runner.core.runner import Runner
+from libcbm_runner.core.runner    import Runner
+from libcbm_runner.core.estimator import CostModel
+from libcbm_runner.core.pipeline  import Pipeline
+from libcbm_runner.core.pool      import WorkerPool
+from libcbm_runner.pump.writer    import writer
+from libcbm_runner.pump.validator import InvalidInputsError
 
 ###############################################################################
 class Combination(object):
@@ -52,6 +58,34 @@ class Combination(object):
 
     short_name = None
 
+    # How results are kept in memory during the simulation. Either 'libcbm'
+    # for the data frames of the libcbm reporting function, 'arrays' for
+    # preallocated arrays filled in place (see `ArrayAccumulator`) or
+    # 'aggregate' to only keep sums by the `group_by` classifiers
+    # (see `GroupAggregator`) #
+    reporting = 'libcbm'
+
+    # The classifiers that results are summed by in 'aggregate' reporting #
+    group_by = ['region', 'forest_type', 'con_broad']
+
+    # Merge inventory records that only differ by their area before the
+    # simulation is run (see `PreProcessor.compact_inventory`) #
+    compact_inventory = False
+
+    # The id of a clear-cut disturbance type in `disturbance_types.csv`. If
+    # set, stands are cut at every timestep to meet the wood demand of the
+    # GFTMX economic model (see `HarvestAllocator`) #
+    demand_harvest = None
+
+    # Check that no carbon is created or lost at every timestep. Either
+    # None, 'warn' to log the problem or 'stop' to end the simulation
+    # (see `MassBalance`) #
+    mass_balance = None
+
+    # Also write the per-stand results to an SQLite database indexed by
+    # stand and timestep, for point queries (see `ResultsDB`) #
+    results_db = False
+
     def __init__(self, continent):
         # Save parent #
         self.continent = continent
@@ -79,33 +113,138 @@ class Combination(object):
         """
         return {c.iso2_code: [Runner(self, c, 0)] for c in self.continent}
 
+    @property_cached
+    def pipeline(self):
+        """Runs runners with their stages overlapping."""
+        return Pipeline(self)
+
     #------------------------------- Methods ---------------------------------#
-    def __call__(self, parallel=False, timer=True):
-        """A method to run a combo by simulating all countries."""
+    def __call__(self, parallel=False, timer=True, resume=False,
+                 profile=None, validate=True, background=False):
+        """
+        A method to run a combo by simulating all countries.
+
+        If `validate` is True, the inputs of every runner are checked once
+        they are final, after `modify_input` and the pre-processing. A
+        runner whose inputs have problems is reported and skipped before
+        being simulated, without stopping the other runners, and its place
+        in the returned list is None.
+
+        If `resume` is True, runners whose manifest shows that they already
+        ran successfully on the current inputs are skipped. Only the failed,
+        missing or stale ones are run again.
+
+        If `profile` is 'cprofile' or 'sampling', every runner is profiled
+        and its profile is saved in its own logs directory.
+
+        If `parallel` is 'pool', countries are run in a `WorkerPool` of
+        prewarmed processes that keep `libcbm` and the country data loaded
+        between runners.
+
+        If `parallel` is 'pipeline', the input preparation, simulation and
+        saving of different countries overlap (see `Pipeline`). Such runs
+        cannot be profiled.
+
+        If `background` is True and countries are run sequentially, the
+        results of each country are written to disk in a background thread
+        while the next country is simulated (see `BackgroundWriter`).
+
+        Whatever the mode, the `output` object of every runner run is
+        returned in a list.
+        """
+        # Check #
+        if profile is not None and background:
+            msg = "Cannot profile runs that finish in the background."
+            raise ValueError(msg)
+        if profile is not None and parallel == 'pipeline':
+            msg = "Cannot profile runs whose stages overlap."
+            raise ValueError(msg)
         # Message #
         print("Running combo '%s'." % self.short_name)
         # Timer start #
         timer = Timer()
         timer.print_start()
+        # Pick which countries need to run #
+        items = list(self.runners.items())
+        if resume: items = self.stale_runners(items)
         # Function to run a single country #
         def run_country(args):
             code, steps = args
             for runner in steps:
-                return runner.run()
+                try:
+                    return runner.run(profile=profile, background=background,
+                                      validate=validate)
+                except InvalidInputsError as error:
+                    runner.log.error(str(error))
+                    print("Runner '%s' skipped: %s" % (runner.short_name,
+                                                       error))
+                    return None
         # Run countries sequentially #
         if not parallel:
-            result = t_map(run_country, self.runners.items())
-        # Run countries in parallel #
-        if parallel:
-            result = p_umap(run_country, self.runners.items(), num_cpus=4)
-        # Timer end #
-        timer.print_end()
-        timer.print_total_elapsed()
-        # Compile logs #
-        self.compile_logs()
+            result = t_map(run_country, items)
+        # Run countries in a pool of prewarmed workers #
+        elif parallel == 'pool':
+            runners = {code: steps[0] for code, steps in items}
+            with WorkerPool(processes=4, countries=list(runners)) as pool:
+                done = pool.run(list(runners.values()), profile=profile,
+                                validate=validate)
+            self.report_failures([runners[code] for _, code, error in done
+                                  if error])
+            result = [runners[code].output for _, code, _ in done]
+        # Run countries with their stages overlapping #
+        elif parallel == 'pipeline':
+            done = self.pipeline([steps[0] for code, steps in items],
+                                 validate=validate)
+            self.report_failures([runner for runner, error in done if error])
+            result = [runner.output for runner, _ in done]
+        # Run countries in parallel, without a writer thread #
+        else:
+            background = False
+            result = p_umap(run_country, items, num_cpus=4)
+        # Wait for the writer thread, raising its first error if any #
+        try: writer.wait()
+        finally:
+            # Timer end #
+            timer.print_end()
+            timer.print_total_elapsed()
+            # Compile logs #
+            self.compile_logs()
         # Return #
         return result
 
+    @staticmethod
+    def report_failures(runners):
+        """Print the runners that failed when running in parallel."""
+        if not runners: return
+        names = ', '.join(runner.short_name for runner in runners)
+        print("%i runners failed: %s" % (len(runners), names))
+
+    def stale_runners(self, items, step=-1):
+        """
+        Filter a list of (country code, runners) tuples, keeping only
+        those where the runner is not up-to-date according to its manifest.
+        """
+        # Check every manifest #
+        result = [(code, steps) for code, steps in items
+                  if not steps[step].manifest.is_current]
+        # Message #
+        msg = "Resuming: %i runners up-to-date, %i runners left to run."
+        print(msg % (len(items) - len(result), len(result)))
+        # Return #
+        return result
+
+    def estimate(self, step=-1):
+        """
+        Predict the time in seconds and the peak memory in MiB of every
+        runner in this combo, in a data frame sorted by decreasing time.
+        The model is calibrated only once for all countries.
+        """
+        model = CostModel.calibrate(self.continent)
+        rows  = [dict(country=code, **steps[step].estimate(model))
+                 for code, steps in self.runners.items()]
+        df = pandas.DataFrame(rows)
+        return df.sort_values('time', ascending=False, ignore_index=True)
+
     def compile_logs(self, step=-1):
         # Open file #
         summary = self.base_dir + 'all_logs.md'
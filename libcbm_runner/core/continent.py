@@ -19,6 +19,7 @@ from plumbing.cache       import property_cached
 # Internal modules #
 from libcbm_runner import libcbm_data_dir
 from libcbm_runner.core.country import Country
+from libcbm_runner.core.cube    import Cube
 from libcbm_runner.combos       import combo_classes
 
 ###############################################################################
@@ -73,6 +74,11 @@ class Continent(object):
         all_combos = [combo(self) for combo in combo_classes]
         return {s.short_name: s for s in all_combos}
 
+    @property_cached
+    def cube(self):
+        """The aggregated results of all combos and countries."""
+        return Cube(self)
+
     #------------------------------- Methods ---------------------------------#
     def get_runner(self, combo, country, step):
         """Return a runner based on combo, country and step."""
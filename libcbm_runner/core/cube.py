@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Written by Lucas Sinclair and Paul Rougieux.
+
+JRC Biomass Project.
+Unit D1 Bioeconomy.
+"""
+
+# Built-in modules #
+import os, glob, pickle, tempfile
+
+# Third party modules #
+import pandas
+
+# First party modules #
+from autopaths.auto_paths import AutoPaths
+
+# Internal modules #
+
+###############################################################################
+class Cube(object):
+    """
+    A continent-wide table of aggregated results with the dimensions
+    combo x country x step x year x classifier group x variable, where the
+    variables are the pools, the fluxes and the indicators computed by the
+    post-processor.
+
+    Every runner adds its own slice when it finishes, as one small file per
+    combo, country and step, written atomically. Runners running in parallel
+    therefore never write to the same file, and a slice is never seen half
+    written. The cube can be queried at any time:
+
+        >>> from libcbm_runner.core.continent import continent
+        >>> cube = continent.cube
+        >>> df = cube.select(combo='historical', table='indicators',
+        >>>                  variable='nbp', country=['LU', 'FR'])
+
+    Scenarios can be compared with arithmetic on series indexed by the
+    dimensions kept:
+
+        >>> cube.diff('special', 'historical', by=['country', 'year'],
+        >>>           table='indicators', variable='nbp')
+    """
+
+    all_paths = """
+    /cube/
+    """
+
+    def __init__(self, parent):
+        # Default attributes #
+        self.parent    = parent
+        self.continent = parent
+        # Directories #
+        self.paths = AutoPaths(self.continent.combos_dir, self.all_paths)
+
+    def __repr__(self):
+        return '%s object with %i slices' % (self.__class__, len(self.files()))
+
+    #------------------------------- Methods ---------------------------------#
+    def slice_path(self, combo, country, step):
+        """The file containing the results of one runner."""
+        name = '%s_%s.pkl' % (country, step)
+        return os.path.join(str(self.paths.cube_dir), combo, name)
+
+    def files(self, combo=None, country=None, step=None):
+        """All the slices on disk, optionally restricted."""
+        combos    = self.as_list(combo)   or ['*']
+        countries = self.as_list(country) or ['*']
+        steps     = self.as_list(step)    or ['*']
+        return sorted(path for c in combos for k in countries for s in steps
+                      for path in glob.glob(self.slice_path(c, k, s)))
+
+    @staticmethod
+    def as_list(value):
+        """Convert a single value to a list, keep None as None."""
+        if value is None: return None
+        if isinstance(value, (list, tuple, set)): return list(value)
+        return [value]
+
+    def add(self, runner, **tables):
+        """
+        Replace the slice of a runner with the tables given, that must be
+        summed by the classifiers of `combo.group_by` and by timestep.
+        """
+        # Message #
+        runner.log.info("Adding the results to the continent cube.")
+        # Convert every table to the long format #
+        group = list(runner.combo.group_by)
+        parts = []
+        for name, df in tables.items():
+            if df is None or df.empty: continue
+            values = [c for c in df.columns
+                      if c not in group + ['timestep', 'year']
+                      and pandas.api.types.is_numeric_dtype(df[c])
+                      and not pandas.api.types.is_bool_dtype(df[c])]
+            df = df.melt(id_vars    = group + ['timestep'],
+                         value_vars = values,
+                         var_name   = 'variable')
+            df.insert(0, 'table', name)
+            parts.append(df)
+        if not parts: return None
+        df = pandas.concat(parts, ignore_index=True)
+        # Add the dimensions #
+        df['year'] = runner.country.timestep_to_year(df.pop('timestep'))
+        df.insert(0, 'step',    runner.num)
+        df.insert(0, 'country', runner.country.iso2_code)
+        df.insert(0, 'combo',   runner.combo.short_name)
+        df['value'] = df['value'].astype(float)
+        # Text columns are stored as categories to keep the files small #
+        for col in ['combo', 'country', 'table', 'variable'] + group:
+            df[col] = df[col].astype('category')
+        # Write atomically #
+        path = self.slice_path(runner.combo.short_name,
+                               runner.country.iso2_code,
+                               runner.num)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, tmp = tempfile.mkstemp(dir=os.path.dirname(path),
+                                       suffix='.tmp')
+        with os.fdopen(handle, 'wb') as stream:
+            pickle.dump(df, stream, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        # Return #
+        return path
+
+    def select(self, combo=None, country=None, step=None, years=None,
+               **filters):
+        """
+        Return the rows of the cube that match the filters given. Every
+        filter can be a single value or a list. Only the files of the
+        combos, countries and steps asked for are read. Other filters can
+        be `table`, `variable` or any classifier.
+        """
+        # Load the slices #
+        frames = []
+        for path in self.files(combo, country, step):
+            with open(path, 'rb') as handle: frames.append(pickle.load(handle))
+        if not frames: return pandas.DataFrame()
+        df = pandas.concat(frames, ignore_index=True)
+        # Filter #
+        mask = pandas.Series(True, index=df.index)
+        if years is not None: mask &= df['year'].isin(self.as_list(years))
+        for col, value in filters.items():
+            mask &= df[col].isin(self.as_list(value))
+        # Return #
+        return df[mask].reset_index(drop=True)
+
+    def series(self, combo, by=('country', 'year'), **filters):
+        """
+        Sum the values of one combo by the dimensions given, returning a
+        series that can be used in arithmetic with another combo. A
+        `variable` filter is required, as different variables cannot be
+        added together.
+        """
+        if filters.get('variable') is None:
+            raise ValueError("Choose the variables to sum with `variable`.")
+        df = self.select(combo=combo, **filters)
+        by = list(by)
+        if df.empty: return pandas.Series(dtype=float)
+        return df.groupby(by, observed=True)['value'].sum()
+
+    def diff(self, first, second, by=('country', 'year'), **filters):
+        """
+        The difference between two combos, e.g. a scenario minus the
+        historical, aligned on the dimensions given.
+        """
+        return self.series(first, by, **filters).sub(
+               self.series(second, by, **filters), fill_value=0)
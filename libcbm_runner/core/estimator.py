@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Written by Lucas Sinclair and Paul Rougieux.
+
+JRC Biomass Project.
+Unit D1 Bioeconomy.
+"""
+
+# Built-in modules #
+
+# Third party modules #
+import numpy, pandas
+
+# First party modules #
+
+# Internal modules #
+from libcbm_runner.info.csv_cache import csv_cache
+
+###############################################################################
+class Estimator(object):
+    """
+    This class predicts how long a runner will take and how much memory it
+    will need, before running it. The prediction only uses cheap statistics
+    of the original input files picked by the combo, such as the number of
+    inventory rows and events and the number of timesteps.
+
+        >>> runner = continent.combos['historical'].runners['LU'][-1]
+        >>> print(runner.estimate())
+        {'time': 41.3, 'memory': 812.5}
+
+    The model is calibrated on the manifests and telemetry of all the
+    runners that were already run, in every combo (see `CostModel`).
+    """
+
+    def __init__(self, parent):
+        # Default attributes #
+        self.parent = parent
+        self.runner = parent
+        # Shortcuts #
+        self.orig  = self.runner.country.orig_data
+        self.combo = self.runner.combo
+
+    def __repr__(self):
+        return '%s object code "%s"' % (self.__class__, self.runner.short_name)
+
+    def __call__(self, model=None):
+        """Predict the time in seconds and the peak memory in MiB."""
+        if model is None: model = CostModel.calibrate(self.combo.continent)
+        return model.predict(self.features)
+
+    #----------------------------- Properties --------------------------------#
+    @property
+    def features(self):
+        """
+        Count the rows that will end up in every input file, by reading the
+        activity files of the original data for the scenarios picked.
+        """
+        # Initialize #
+        result = {name: 0 for name in self.orig.files_to_be_generated}
+        years  = []
+        # Every input file #
+        for input_file in self.orig.files_to_be_generated:
+            choices = getattr(self.combo, input_file, {})
+            for activity, scenario in choices.items():
+                # Read the file #
+                path = self.orig.paths.activities_dir + activity + '/'
+                path = path + input_file + '.csv'
+                try: df = csv_cache.read(path)
+                except (FileNotFoundError, pandas.errors.EmptyDataError):
+                    continue
+                # Filter rows to take only this scenario #
+                df = df.query("scenario == '%s'" % scenario)
+                # Other files have one row per record #
+                if input_file != 'events':
+                    result[input_file] += len(df)
+                    continue
+                # Events are in the wide format, one column per year #
+                cols = [c for c in df.columns if c.startswith('amount_')]
+                filled = df[cols].notna().sum()
+                result[input_file] += int(filled.sum())
+                used = filled[filled > 0].index
+                years += [int(col.split('_')[-1]) for col in used]
+        # The number of timesteps, as decided by the runner #
+        try: result['num_timesteps'] = int(self.runner.num_timesteps)
+        # The default reads the input data, which might not exist yet #
+        except (FileNotFoundError, pandas.errors.EmptyDataError):
+            if not years: result['num_timesteps'] = 0
+            else: result['num_timesteps'] = \
+                int(self.runner.country.year_to_timestep(max(years)))
+        # Return #
+        return result
+
+###############################################################################
+class CostModel(object):
+    """
+    A linear model of the cost of a runner. The time is explained by the
+    number of stand-timesteps to simulate, the number of events and growth
+    curves and the number of timesteps. The memory by the number of
+    stand-timesteps, which drives the size of the results, and the number of
+    stands.
+
+    The coefficients are fitted by least squares on past runs, so they adapt
+    to the machine used. The time is the wall time of the whole run,
+    including the preparation of the inputs and the saving of the results,
+    as recorded in the manifest. The memory is the peak recorded by
+    `Telemetry`, for the runs that had their process to themselves, and
+    is NaN without any. With too few runs to fit every term, a single rate
+    per stand-timestep is used instead.
+    """
+
+    # Names of the terms of each model, besides the intercept. The first one
+    # is also used alone when there are too few runs #
+    time_terms   = ['stand_steps', 'events', 'growth_curves',
+                    'num_timesteps']
+    memory_terms = ['stand_steps', 'inventory']
+
+    def __init__(self, time_coefs, memory_coefs, num_runs=0):
+        self.time_coefs   = numpy.asarray(time_coefs)
+        self.memory_coefs = numpy.asarray(memory_coefs)
+        self.num_runs     = num_runs
+
+    def __repr__(self):
+        msg = '%s object calibrated on %i runs'
+        return msg % (self.__class__, self.num_runs)
+
+    #------------------------------- Methods ---------------------------------#
+    @staticmethod
+    def terms(features, names):
+        """Build the explanatory variables, with an intercept first."""
+        features = dict(features)
+        features['stand_steps'] = features['inventory'] * \
+                                  features['num_timesteps']
+        return [1.0] + [float(features[name]) for name in names]
+
+    @classmethod
+    def calibrate(cls, continent):
+        """
+        Fit the model on every runner of every combo that has a telemetry
+        table and a wall time in its manifest on disk. The memory model
+        only uses the runs that had their process to themselves.
+        """
+        # Gather one row per past run #
+        rows = []
+        for combo in continent.combos.values():
+            for runners in combo.runners.values():
+                for runner in runners:
+                    if not runner.telemetry: continue
+                    content = runner.manifest.contents or {}
+                    if content.get('elapsed') is None: continue
+                    df = runner.telemetry.load()
+                    # The memory of other runners was also measured #
+                    alone = 'mode' not in df or (df['mode'] == 'alone').all()
+                    rows.append((runner.estimator.features,
+                                 content['elapsed'],
+                                 df['rss_mib'].max() if alone else None))
+        # Check #
+        if not rows:
+            msg = "No telemetry found on disk, run at least one runner first."
+            raise Exception(msg)
+        # Fit both models #
+        time_x   = [cls.terms(f, cls.time_terms)   for f, _, _ in rows]
+        memory_x = [cls.terms(f, cls.memory_terms) for f, _, m in rows
+                    if m is not None]
+        time_y   = [t for _, t, _ in rows]
+        memory_y = [m for _, _, m in rows if m is not None]
+        time_coefs   = cls.fit(time_x,   time_y)
+        # Without any run alone, the memory cannot be predicted #
+        if memory_y: memory_coefs = cls.fit(memory_x, memory_y)
+        else: memory_coefs = numpy.full(len(cls.memory_terms) + 1, numpy.nan)
+        # Return #
+        return cls(time_coefs, memory_coefs, len(rows))
+
+    @staticmethod
+    def fit(x, y):
+        """
+        Least squares when there are more runs than coefficients, otherwise
+        the average cost of one stand-timestep, which is the first term.
+        """
+        x, y = numpy.asarray(x, dtype=float), numpy.asarray(y, dtype=float)
+        if len(y) > x.shape[1]: return numpy.linalg.lstsq(x, y, rcond=None)[0]
+        coefs = numpy.zeros(x.shape[1])
+        coefs[1] = y.sum() / max(x[:, 1].sum(), 1.0)
+        return coefs
+
+    def predict(self, features):
+        """Predict the time in seconds and the peak memory in MiB."""
+        time   = numpy.dot(self.time_coefs,
+                           self.terms(features, self.time_terms))
+        memory = numpy.dot(self.memory_coefs,
+                           self.terms(features, self.memory_terms))
+        return {'time':   round(max(float(time),   0.0), 1),
+                'memory': round(max(float(memory), 0.0), 1)}
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Written by Lucas Sinclair and Paul Rougieux.
+
+JRC Biomass Project.
+Unit D1 Bioeconomy.
+"""
+
+# Built-in modules #
+import os, hashlib, platform
+
+# Third party modules #
+import pandas
+import simplejson as json
+
+# First party modules #
+from autopaths.auto_paths import AutoPaths
+
+# Internal modules #
+import libcbm_runner
+from libcbm_runner.info.csv_cache import csv_cache
+
+###############################################################################
+class Manifest(object):
+    """
+    This class records a fingerprint of everything that went into a runner
+    (the original country files, the scenario choices of the combo and the
+    versions of the libraries used) and of everything that came out of it
+    (the output files).
+
+    A combo can then skip runners that are already up-to-date:
+
+        >>> from libcbm_runner.core.continent import continent
+        >>> runner = continent.combos['historical'].runners['LU'][-1]
+        >>> print(runner.manifest.is_current)
+
+    The manifest is removed at the start of every run and only written
+    once the run succeeded, so a missing manifest means that the runner
+    either never ran, failed or was interrupted.
+
+    The size and modification time of every output file are recorded with
+    its hash, so that checking a large output that did not change does not
+    require reading it again.
+    """
+
+    all_paths = """
+    /logs/manifest.json
+    """
+
+    # The directories of the country that are read by a runner #
+    country_dirs = ['common', 'config', 'activities', 'extras']
+
+    # The combo attributes that define the scenario choices #
+    combo_attrs = ['silv', 'inventory', 'events', 'growth_curves',
+                   'transitions']
+
+    def __init__(self, parent):
+        # Default attributes #
+        self.parent = parent
+        self.runner = parent
+        # Directories #
+        self.paths = AutoPaths(self.runner.data_dir, self.all_paths)
+
+    def __repr__(self):
+        return '%s object code "%s"' % (self.__class__, self.runner.short_name)
+
+    def __bool__(self): return self.paths.manifest.exists
+
+    #----------------------------- Properties --------------------------------#
+    @property
+    def versions(self):
+        """The versions of the libraries that influence the results."""
+        # libcbm is only needed when a simulation is actually run #
+        try:
+            import libcbm
+            libcbm_version = getattr(libcbm, '__version__', 'unknown')
+        except ImportError:
+            libcbm_version = None
+        # Return #
+        return {'libcbm_runner': libcbm_runner.__version__,
+                'libcbm':        libcbm_version,
+                'pandas':        pandas.__version__,
+                'python':        platform.python_version()}
+
+    @property
+    def choices(self):
+        """The scenario choices and years that define this runner."""
+        choices = {attr: getattr(self.runner.combo, attr, {})
+                   for attr in self.combo_attrs}
+        choices['combo']                = self.runner.combo.short_name
+        choices['base_year']            = int(self.runner.country.base_year)
+        choices['inventory_start_year'] = \
+            int(self.runner.country.inventory_start_year)
+        return choices
+
+    @property
+    def input_files(self):
+        """All the original country files that this runner depends on."""
+        data_dir = self.runner.country.data_dir
+        result = []
+        for name in self.country_dirs:
+            directory = data_dir + name + '/'
+            for root, dirs, files in os.walk(str(directory)):
+                dirs[:] = sorted(d for d in dirs if d != csv_cache.dir_name)
+                result += [os.path.join(root, f) for f in sorted(files)]
+        return result
+
+    @property
+    def output_files(self):
+        """All the files that were produced in the output directory."""
+        result = []
+        for root, dirs, files in os.walk(str(self.runner.paths.output_dir)):
+            dirs.sort()
+            result += [os.path.join(root, f) for f in sorted(files)]
+        return result
+
+    @property
+    def inputs_hash(self):
+        """A single hash summarizing the inputs, choices and versions."""
+        md5 = hashlib.md5()
+        # The original files #
+        data_dir = str(self.runner.country.data_dir)
+        for path in self.input_files:
+            md5.update(os.path.relpath(path, data_dir).encode())
+            md5.update(self.file_hash(path).encode())
+        # The choices and versions #
+        md5.update(json.dumps(self.choices,  sort_keys=True).encode())
+        md5.update(json.dumps(self.versions, sort_keys=True).encode())
+        # Return #
+        return md5.hexdigest()
+
+    @property
+    def contents(self):
+        """Load the manifest from disk, or return None if there is none."""
+        if not self: return None
+        return json.loads(self.paths.manifest.contents)
+
+    @property
+    def is_current(self):
+        """
+        Return True if the manifest on disk matches the current inputs and
+        every output file recorded is still present and unchanged.
+        """
+        # Load #
+        content = self.contents
+        if content is None: return False
+        # Check the inputs #
+        if content.get('inputs') != self.inputs_hash: return False
+        # Check the outputs #
+        outputs = content.get('outputs', {})
+        if not outputs: return False
+        for path, record in outputs.items():
+            path = os.path.join(str(self.runner.data_dir), path)
+            if not os.path.exists(path): return False
+            if not self.same_file(path, record): return False
+        # Everything matches #
+        return True
+
+    #------------------------------- Methods ---------------------------------#
+    @staticmethod
+    def file_hash(path):
+        """Compute the md5 of a file by reading it in blocks."""
+        md5 = hashlib.md5()
+        with open(os.path.realpath(path), 'rb') as handle:
+            for block in iter(lambda: handle.read(1 << 20), b""):
+                md5.update(block)
+        return md5.hexdigest()
+
+    @staticmethod
+    def file_stat(path):
+        """The size and modification time of a file in nanoseconds."""
+        stat = os.stat(path)
+        return {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+    def file_record(self, path):
+        """Everything recorded about one output file."""
+        return dict(self.file_stat(path), md5=self.file_hash(path))
+
+    def same_file(self, path, record):
+        """
+        Compare a file to its record. The hash is only computed when the
+        size is the same but the modification time changed. Older
+        manifests only recorded the hash.
+        """
+        if isinstance(record, str): return self.file_hash(path) == record
+        stat = self.file_stat(path)
+        if stat['size'] != record['size']: return False
+        if stat['mtime'] == record['mtime']: return True
+        return self.file_hash(path) == record['md5']
+
+    def write(self, elapsed=None):
+        """
+        Record the current inputs and outputs to the manifest file, and the
+        wall time of the run in seconds if given.
+        """
+        # Message #
+        self.runner.log.info("Writing the manifest of the run.")
+        # Hash every output file relative to the runner directory #
+        data_dir = str(self.runner.data_dir)
+        outputs  = {os.path.relpath(path, data_dir): self.file_record(path)
+                    for path in self.output_files}
+        # Build the dictionary #
+        content = {'runner':   self.runner.short_name,
+                   'inputs':   self.inputs_hash,
+                   'choices':  self.choices,
+                   'versions': self.versions,
+                   'outputs':  outputs,
+                   'elapsed':  elapsed}
+        # Write #
+        self.paths.manifest.write(json.dumps(content, indent=4))
+        # Return #
+        return self.paths.manifest
+
+    def remove(self):
+        """Remove the manifest so that the runner is considered stale."""
+        self.paths.manifest.remove()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Written by Lucas Sinclair and Paul Rougieux.
+
+JRC Biomass Project.
+Unit D1 Bioeconomy.
+"""
+
+# Built-in modules #
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+# Third party modules #
+from tqdm import tqdm
+
+# First party modules #
+
+# Internal modules #
+
+###############################################################################
+class Pipeline(object):
+    """
+    Runs the runners of a combo with their three stages overlapping. While
+    one runner simulates, the next one prepares its input data and the
+    previous one saves and post-processes its results:
+
+        prepare   | LU | FR | DE |    |    |
+        simulate  |    | LU | FR | DE |    |
+        finish    |    |    | LU | FR | DE |
+
+    Each stage has its own pool of threads, of a given size. The stages are
+    the methods `prepare`, `simulate` and `finish` of the runner. They have
+    to run in the same process because a runner keeps its state between
+    them. Only some parts release the GIL: the compiled core of the model,
+    called through `ctypes`, and `zlib` while it compresses the output
+    tables. The pandas work of preparing the inputs, of the rule based
+    event processing and of formatting the CSV files holds it, so the
+    stages partly contend with each other and the total time stays above
+    the time of the simulations alone. This has not been benchmarked yet.
+    To use several cores fully, run countries in processes instead, with
+    `parallel='pool'`.
+
+    At most `max_in_flight` runners are between the start of their first
+    stage and the end of their last stage, which bounds the memory used.
+
+        >>> combo = continent.combos['historical']
+        >>> combo.pipeline([steps[-1] for steps in combo], simulate=2)
+    """
+
+    # The stages in the order they run #
+    stages = ['prepare', 'simulate', 'finish']
+
+    def __init__(self, parent):
+        # Default attributes #
+        self.parent = parent
+        self.combo  = parent
+
+    def __repr__(self):
+        return '%s object on combo "%s"' % (self.__class__,
+                                            self.combo.short_name)
+
+    def __call__(self, runners, prepare=1, simulate=1, finish=1,
+                 max_in_flight=None, keep_in_ram=False,
+                 interrupt_on_error=False, validate=False):
+        """
+        Run every runner given and return a list of (runner, error) tuples
+        in the order in which they finished, where `error` is True if the
+        simulation failed or any stage raised an exception.
+        """
+        # The size of each pool #
+        sizes = dict(prepare=prepare, simulate=simulate, finish=finish)
+        if max_in_flight is None: max_in_flight = sum(sizes.values())
+        # The arguments of each stage #
+        kwargs = dict(prepare  = {'validate':           validate},
+                      simulate = {'interrupt_on_error': interrupt_on_error},
+                      finish   = {'keep_in_ram':        keep_in_ram})
+        # One pool per stage #
+        pools = {name: ThreadPoolExecutor(max_workers        = sizes[name],
+                                          thread_name_prefix = name)
+                 for name in self.stages}
+        # Limit the runners in flight #
+        slots = threading.BoundedSemaphore(max_in_flight)
+        # Run a stage, then submit the next one when it is done #
+        def submit(runner, index, final):
+            name = self.stages[index]
+            method = getattr(runner, name)
+            future = pools[name].submit(method, **kwargs[name])
+            future.add_done_callback(
+                lambda f: advance(runner, index, final, f))
+        def advance(runner, index, final, future):
+            # The stage raised, the runner has already cleaned up #
+            if future.exception() is not None:
+                runner.log.error("Stage '%s' failed: %r" %
+                                 (self.stages[index], future.exception()))
+                slots.release()
+                final.set_result((runner, True))
+                return
+            # Go to the next stage #
+            if index + 1 < len(self.stages):
+                return submit(runner, index + 1, final)
+            # The runner is done #
+            slots.release()
+            final.set_result((runner, runner.simulation.error is True))
+        # Feed the runners, blocking when too many are in flight #
+        finals = []
+        try:
+            for runner in runners:
+                slots.acquire()
+                runner.run_mode = 'pipeline'
+                final = Future()
+                finals.append(final)
+                submit(runner, 0, final)
+            # Wait with a progress bar #
+            done = as_completed(finals)
+            result = [f.result() for f in tqdm(done, total=len(finals))]
+        finally:
+            for pool in pools.values(): pool.shutdown(wait=True)
+        # Return #
+        return result
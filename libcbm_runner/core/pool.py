@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Written by Lucas Sinclair and Paul Rougieux.
+
+JRC Biomass Project.
+Unit D1 Bioeconomy.
+"""
+
+# Built-in modules #
+import importlib, traceback, multiprocessing
+
+# Third party modules #
+from tqdm import tqdm
+
+# First party modules #
+
+# Internal modules #
+
+# The modules that every worker imports once #
+preload = ['pandas',
+           'libcbm.input.sit.sit_cbm_factory',
+           'libcbm.model.cbm.cbm_simulator',
+           'libcbm_runner.core.continent']
+
+###############################################################################
+def warm_up(countries=None):
+    """
+    Executed once in every worker when it starts. Imports the heavy modules
+    and loads the associations and classifiers of the countries that will
+    be needed, so that they stay in memory for all the tasks that the worker
+    runs. The AIDB is not preloaded, `libcbm` opens it again for every run.
+    """
+    # Import #
+    for name in preload: importlib.import_module(name)
+    from libcbm_runner.core.continent import continent
+    # Load the country data #
+    for code in countries or []:
+        country = continent.countries[code]
+        country.associations.all_mappings
+        country.orig_data.classif_names
+
+def run_runner(args):
+    """
+    Executed in a worker for every task. The runner is found through the
+    `continent` singleton of the worker, so that the countries and combos
+    already loaded by previous tasks are reused. Any exception is caught
+    and reported as an error, so that one runner cannot stop the others.
+    """
+    combo, code, step, kwargs = args
+    from libcbm_runner.core.continent import continent
+    try:
+        runner = continent[combo, code, step]
+        runner.run(**kwargs)
+        # Free the simulation but keep the country data #
+        runner.simulation.clear()
+    except Exception:
+        print("Runner '%s/%s/%s' failed:" % (combo, code, step))
+        traceback.print_exc()
+        return combo, code, True
+    # Return #
+    return combo, code, runner.simulation.error is True
+
+###############################################################################
+class WorkerPool(object):
+    """
+    A pool of processes to run many runners, where the cost of starting a
+    worker is only paid once instead of for every runner.
+
+    The workers are started from a fork server that has already imported
+    `libcbm` and `pandas`, and each worker loads the data of the countries
+    when it starts (see `warm_up`). Workers then run many runners one after
+    the other. To bound the growth of memory, each worker is replaced by a
+    fresh one after `max_tasks` runners.
+
+        >>> from libcbm_runner.core.pool import WorkerPool
+        >>> with WorkerPool(processes=8) as pool:
+        >>>     pool.run(combo.runners, max_tasks=20)
+
+    This is most useful when running many short runners, such as small
+    countries, ensembles or sensitivity runs.
+    """
+
+    def __init__(self, processes=4, max_tasks=20, countries=None):
+        # Base attributes #
+        self.processes = processes
+        self.max_tasks = max_tasks
+        self.countries = countries
+        # Will be set when started #
+        self.pool = None
+
+    def __repr__(self):
+        return '%s object with %i processes' % (self.__class__,
+                                                self.processes)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    #----------------------------- Properties --------------------------------#
+    @property
+    def context(self):
+        """The fork server is not available on every platform."""
+        methods = multiprocessing.get_all_start_methods()
+        if 'forkserver' not in methods:
+            return multiprocessing.get_context('spawn')
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(preload)
+        return context
+
+    #------------------------------- Methods ---------------------------------#
+    def start(self):
+        """Start all the workers and warm them up."""
+        self.pool = self.context.Pool(processes        = self.processes,
+                                      initializer      = warm_up,
+                                      initargs         = (self.countries,),
+                                      maxtasksperchild = self.max_tasks)
+
+    def stop(self):
+        """Wait for the tasks to finish and stop the workers."""
+        if self.pool is None: return
+        self.pool.close()
+        self.pool.join()
+        self.pool = None
+
+    def run(self, runners, **kwargs):
+        """
+        Run a list of runners and return a list of (combo, country, error)
+        tuples in the order in which they finished. The keyword arguments
+        are passed to every `runner.run()`.
+        """
+        # Start if needed #
+        if self.pool is None: self.start()
+        # The tasks only contain names, not the objects themselves #
+        tasks = [(r.combo.short_name, r.country.iso2_code, r.num, kwargs)
+                 for r in runners]
+        # Run with a progress bar #
+        results = self.pool.imap_unordered(run_runner, tasks, chunksize=1)
+        return list(tqdm(results, total=len(tasks)))
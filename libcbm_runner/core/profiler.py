@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Written by Lucas Sinclair and Paul Rougieux.
+
+JRC Biomass Project.
+Unit D1 Bioeconomy.
+"""
+
+# Built-in modules #
+import os, io, sys, time, pstats, cProfile, threading, collections
+from xml.sax.saxutils import escape
+
+# Third party modules #
+
+# First party modules #
+from autopaths.auto_paths import AutoPaths
+
+# Internal modules #
+
+###############################################################################
+class Profiler(object):
+    """
+    This class wraps the run of a runner in a profiler, to find out where
+    the time is spent without editing any code. Two modes are available:
+
+        * 'cprofile': the deterministic profiler of the standard library.
+          Saves a `profile.prof` file that can be opened with `snakeviz` or
+          `pstats`, and a text summary of the most expensive functions.
+
+        * 'sampling': a background thread records the call stack of the
+          running thread at regular intervals. This has a low overhead and
+          also sees the time spent inside `libcbm`. Saves the stacks in
+          the "collapsed" format used by flamegraph tools, and renders them
+          to an SVG flamegraph directly.
+
+    In sampling mode, every sample can be tagged with the timestep that was
+    running, so that the flamegraph shows one tower per timestep.
+
+        >>> runner.run(profile='sampling')
+        >>> print(runner.profiler.paths.summary.contents)
+    """
+
+    all_paths = """
+    /logs/profile/
+    /logs/profile/profile.prof
+    /logs/profile/summary.txt
+    /logs/profile/stacks.txt
+    /logs/profile/flamegraph.svg
+    """
+
+    # The available modes #
+    modes = ['cprofile', 'sampling']
+
+    # Seconds between two samples #
+    interval = 0.005
+
+    # Number of functions listed in the summary #
+    num_lines = 60
+
+    def __init__(self, parent):
+        # Default attributes #
+        self.parent = parent
+        self.runner = parent
+        # Directories #
+        self.paths = AutoPaths(self.parent.data_dir, self.all_paths)
+        # The timestep that is running, set by the simulation #
+        self.timestep = None
+        self.per_timestep = False
+
+    def __repr__(self):
+        return '%s object code "%s"' % (self.__class__, self.runner.short_name)
+
+    #--------------------------- Special Methods -----------------------------#
+    def __call__(self, mode, func, *args, per_timestep=False, **kwargs):
+        """Call `func` with the arguments given inside the profiler."""
+        # Check #
+        if mode not in self.modes:
+            msg = "Unknown profiling mode '%s', choose amongst %s."
+            raise ValueError(msg % (mode, self.modes))
+        # Initialize #
+        self.timestep     = None
+        self.per_timestep = per_timestep
+        # The simulation tags the timesteps of the active profiler #
+        self.runner.profiling = self
+        # Run #
+        method = getattr(self, mode)
+        try: result = method(func, *args, **kwargs)
+        finally:
+            self.runner.profiling = None
+        # Message #
+        msg = "Profile saved in '%s'."
+        self.runner.log.info(msg % self.paths.profile_dir)
+        # Return #
+        return result
+
+    #------------------------------- Methods ---------------------------------#
+    def cprofile(self, func, *args, **kwargs):
+        """Run with the deterministic profiler of the standard library."""
+        # Run #
+        profile = cProfile.Profile()
+        try: return profile.runcall(func, *args, **kwargs)
+        # Save even if there was an exception #
+        finally:
+            profile.dump_stats(str(self.paths.prof))
+            stream = io.StringIO()
+            stats  = pstats.Stats(profile, stream=stream)
+            stats.sort_stats('cumulative').print_stats(self.num_lines)
+            self.paths.summary.write(stream.getvalue())
+
+    def sampling(self, func, *args, **kwargs):
+        """Run while a thread records the call stack at regular intervals."""
+        # The thread we want to observe #
+        target  = threading.get_ident()
+        counts  = collections.Counter()
+        stopped = threading.Event()
+        # The sampling loop #
+        def sample():
+            while not stopped.wait(self.interval):
+                frame = sys._current_frames().get(target)
+                if frame is None: continue
+                counts[self.stack(frame)] += 1
+        # Run #
+        thread = threading.Thread(target=sample, daemon=True)
+        start  = time.time()
+        thread.start()
+        try: return func(*args, **kwargs)
+        # Save even if there was an exception #
+        finally:
+            stopped.set()
+            thread.join()
+            self.save_samples(counts, time.time() - start)
+
+    def stack(self, frame):
+        """
+        Convert a frame to a string of function names separated by
+        semicolons, the outermost call first.
+        """
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            file = os.path.basename(code.co_filename)
+            names.append('%s (%s:%i)' % (code.co_name, file,
+                                         code.co_firstlineno))
+            frame = frame.f_back
+        if self.per_timestep and self.timestep is not None:
+            names.append('timestep %i' % self.timestep)
+        return ';'.join(reversed(names))
+
+    def save_samples(self, counts, elapsed):
+        """Write the collapsed stacks, a summary and the flamegraph."""
+        # Collapsed stacks #
+        lines = ['%s %i' % (stack, n) for stack, n in counts.most_common()]
+        self.paths.stacks.write('\n'.join(lines) + '\n')
+        # Summary of the functions where the samples were taken #
+        total = sum(counts.values()) or 1
+        inner = collections.Counter()
+        for stack, n in counts.items(): inner[stack.split(';')[-1]] += n
+        summary  = "%i samples over %.1f seconds.\n\n" % (total, elapsed)
+        summary += "Self time by function:\n\n"
+        for name, n in inner.most_common(self.num_lines):
+            summary += "%6.2f%%  %s\n" % (100 * n / total, name)
+        self.paths.summary.write(summary)
+        # Flamegraph #
+        self.paths.flamegraph.write(self.flamegraph(counts))
+
+    @staticmethod
+    def flamegraph(counts, width=1200, height=16):
+        """Render collapsed stacks to an SVG flamegraph."""
+        # Build a tree of nested dictionaries with a count for every node #
+        tree = {}
+        for stack, n in counts.items():
+            node = tree
+            for name in stack.split(';'):
+                child = node.setdefault(name, [0, {}])
+                child[0] += n
+                node = child[1]
+        total = sum(counts.values()) or 1
+        # Lay out the boxes recursively #
+        boxes = []
+        def layout(node, x, depth):
+            for name, (n, children) in sorted(node.items()):
+                w = width * n / total
+                boxes.append((x, depth, w, name, n))
+                layout(children, x, depth + 1)
+                x += w
+        layout(tree, 0.0, 0)
+        # Render #
+        depth = max([b[1] for b in boxes], default=0) + 1
+        svg = ['<svg xmlns="http://www.w3.org/2000/svg" width="%i" '
+               'height="%i" font-family="monospace" font-size="11">'
+               % (width, depth * height)]
+        for x, level, w, name, n in boxes:
+            if w < 0.5: continue
+            y   = (depth - level - 1) * height
+            hue = 10 + sum(map(ord, name)) % 50
+            label = escape(name[:int(w / 7)]) if w > 21 else ''
+            svg.append('<g><title>%s (%i samples, %.2f%%)</title>'
+                       '<rect x="%.1f" y="%i" width="%.1f" height="%i" '
+                       'fill="hsl(%i,90%%,60%%)" stroke="white"/>'
+                       '<text x="%.1f" y="%i">%s</text></g>'
+                       % (escape(name), n, 100 * n / total, x, y, w,
+                          height - 1, hue, x + 2, y + height - 4, label))
+        svg.append('</svg>')
+        return '\n'.join(svg)
@@ -18,13 +18,24 @@ from plumbing.timer       import LogTimer
 
 # Internal modules #
 import libcbm_runner
+from libcbm_runner.core.estimator      import Estimator
+from libcbm_runner.core.manifest       import Manifest
+from libcbm_runner.core.profiler       import Profiler
+from libcbm_runner.core.staging        import Staging
 from libcbm_runner.launch.create_json  import CreateJSON
+from libcbm_runner.launch.ensemble     import Ensemble
 from libcbm_runner.launch.simulation   import Simulation
+from libcbm_runner.launch.telemetry    import Telemetry
 from libcbm_runner.info.input_data     import InputData
 from libcbm_runner.pump.output_data    import OutputData
+from libcbm_runner.pump.aggregate_data import AggregateData
+from libcbm_runner.pump.hwp            import HarvestedWoodProducts
 from libcbm_runner.pump.internal_data  import InternalData
 from libcbm_runner.pump.pre_processor  import PreProcessor
+from libcbm_runner.pump.results_db     import ResultsDB
 from libcbm_runner.pump.post_processor import PostProcessor
+from libcbm_runner.pump.validator      import Validator
+from libcbm_runner.pump.writer         import writer
 
 # Third party modules
 import pandas
@@ -79,6 +90,10 @@ class Runner(object):
         self.data_dir = self.combo.combos_dir + self.short_name + '/'
         # Automatically access paths based on a string of many subpaths #
         self.paths = AutoPaths(self.data_dir, self.all_paths)
+        # The profiler of the run in progress, if any #
+        self.profiling = None
+        # How the run in progress shares its process with other runners #
+        self.run_mode = 'alone'
 
     def __repr__(self):
         return '%s object on "%s"' % (self.__class__, self.data_dir)
@@ -95,6 +110,16 @@ class Runner(object):
         """The object that can run `libcbm` simulations."""
         return Simulation(self)
 
+    @property_cached
+    def ensemble(self):
+        """Run many perturbed copies of this runner in one simulation."""
+        return Ensemble(self)
+
+    @property_cached
+    def validator(self):
+        """Check the final inputs of this run before simulating."""
+        return Validator(self)
+
     @property_cached
     def pre_processor(self):
         """Update the input data to this run using some rules."""
@@ -105,6 +130,11 @@ class Runner(object):
         """Update or convert the output data to this run using some rules."""
         return PostProcessor(self)
 
+    @property_cached
+    def hwp(self):
+        """Carbon in harvested wood products, computed after a run."""
+        return HarvestedWoodProducts(self)
+
     @property_cached
     def input_data(self):
         """
@@ -118,6 +148,19 @@ class Runner(object):
         """Create and access the output data to this run."""
         return OutputData(self)
 
+    @property_cached
+    def results_db(self):
+        """An optional copy of the output indexed for point queries."""
+        return ResultsDB(self)
+
+    @property_cached
+    def aggregate(self):
+        """
+        Access the output data summed by groups of classifiers, when the
+        combo does not keep per-stand results.
+        """
+        return AggregateData(self)
+
     @property_cached
     def internal(self):
         """
@@ -126,6 +169,34 @@ class Runner(object):
         """
         return InternalData(self)
 
+    @property_cached
+    def manifest(self):
+        """
+        Fingerprint of the inputs and outputs of the last successful run,
+        used to decide if this runner needs to be run again.
+        """
+        return Manifest(self)
+
+    @property_cached
+    def telemetry(self):
+        """A time series of the duration and size of every timestep."""
+        return Telemetry(self)
+
+    @property_cached
+    def estimator(self):
+        """Predicts the time and memory this runner will need."""
+        return Estimator(self)
+
+    @property_cached
+    def staging(self):
+        """Stages each run and publishes it atomically when it succeeds."""
+        return Staging(self)
+
+    @property_cached
+    def profiler(self):
+        """Optionally wraps a run to find out where the time is spent."""
+        return Profiler(self)
+
     #----------------------------- Properties --------------------------------#
     @property_cached
     def log(self):
@@ -169,39 +240,115 @@ class Runner(object):
         return period_max
 
     #------------------------------- Methods ---------------------------------#
-    def run(self, keep_in_ram=False, verbose=True, interrupt_on_error=False):
+    def run(self, keep_in_ram=False, verbose=True, interrupt_on_error=False,
+            profile=None, profile_timesteps=False, background=False,
+            validate=False):
         """
         Run the full modelling pipeline for a given country, a given combo
         and a given step.
+
+        If `validate` is True, the final inputs are checked before the
+        simulation starts and an exception lists every problem found (see
+        `Validator`).
+
+        If `profile` is 'cprofile' or 'sampling', the run is profiled and the
+        results are saved in the logs directory (see `Profiler`). With
+        `profile_timesteps`, the samples are also split by timestep.
+
+        If `background` is True, the results are saved, post-processed and
+        published by the `BackgroundWriter` thread and this method returns
+        as soon as the simulation is over, returning an `output` object
+        that points to the published results, not to the staging directory.
+        Call `writer.wait()` before reading the results.
+        A run finishing in the background cannot be profiled.
         """
+        # Check #
+        if profile is not None and background:
+            msg = "Cannot profile a run that finishes in the background."
+            raise ValueError(msg)
+        # Optionally profile the run #
+        if profile is not None:
+            return self.profiler(profile, self.run, keep_in_ram, verbose,
+                                 interrupt_on_error, validate=validate,
+                                 per_timestep=profile_timesteps)
         # Verbosity level #
         self.verbose = verbose
-        # Messages #
-        self.log.info("Using %s." % libcbm_runner)
-        self.log.info("Runner '%s' starting." % self.short_name)
-        # Start the timer #
-        self.timer = LogTimer(self.log)
-        self.timer.print_start()
-        # Clean everything from previous run #
-        self.remove_directories()
-        # Create the input data #
-        self.input_data()
-        # Modify input data, combos can subclass this #
-        self.modify_input()
-        # Pre-processing #
-        self.pre_processor()
-        # Create the JSON configuration #
-        self.create_json()
-        # Run the model #
-        self.timer.print_elapsed()
-        self.simulation(interrupt_on_error)
-        self.timer.print_elapsed()
-        # Save the results to disk #
-        if self.simulation.error is not True: self.output.save()
-        # Free memory #
-        if not keep_in_ram: self.simulation.clear()
-        # Post-processing #
-        self.post_processor()
+        # Recorded in the telemetry #
+        self.run_mode = 'background' if background else 'alone'
+        # Prepare the inputs and run the model #
+        self.prepare(validate)
+        self.simulate(interrupt_on_error)
+        # Writing the results can overlap with the next runner #
+        if background:
+            writer.submit(self.finish, keep_in_ram)
+            return OutputData(self, self.staging.base_dir)
+        # Return #
+        return self.finish(keep_in_ram)
+
+    def prepare(self, validate=False):
+        """
+        Create the input data of the simulation in a new staging directory.
+        This is the first stage of a run, see also `Pipeline`. With
+        `validate`, the input data is checked once it is complete.
+        """
+        # The published results are stale until this run succeeds #
+        self.manifest.remove()
+        # Write to a new staging directory, published only on success #
+        self.staging.open()
+        try:
+            # Messages #
+            self.log.info("Using %s." % libcbm_runner)
+            self.log.info("Runner '%s' starting." % self.short_name)
+            # Start the timer #
+            self.timer = LogTimer(self.log)
+            self.timer.print_start()
+            # Clean everything from previous run #
+            self.remove_directories()
+            # Create the input data #
+            self.input_data()
+            # Modify input data, combos can subclass this #
+            self.modify_input()
+            # Pre-processing #
+            self.pre_processor()
+            # Check the final input data #
+            if validate: self.validator.raise_if_invalid()
+            # Create the JSON configuration #
+            self.create_json()
+        except BaseException:
+            self.staging.close()
+            raise
+
+    def simulate(self, interrupt_on_error=False):
+        """Run the model. This is the second stage of a run."""
+        try:
+            self.timer.print_elapsed()
+            self.simulation(interrupt_on_error)
+            self.timer.print_elapsed()
+        except BaseException:
+            self.staging.close()
+            raise
+
+    def finish(self, keep_in_ram=False):
+        """
+        Save, post-process and publish the results of the simulation that
+        was just run. This is the third stage of a run, and can happen in
+        the background writer thread.
+        """
+        try:
+            # Save the results to disk #
+            if self.simulation.error is not True: self.output.save()
+            # Free memory #
+            if not keep_in_ram: self.simulation.clear()
+            # Post-processing #
+            if self.simulation.error is not True: self.post_processor()
+            # Swap the new input and output into place #
+            if self.simulation.error is not True: self.staging.commit()
+        finally:
+            self.staging.close()
+        # Record what went in and out so that combos can resume #
+        elapsed = (self.timer.get_now() - self.timer.start_time)
+        if self.simulation.error is not True:
+            self.manifest.write(elapsed.total_seconds())
         # Messages #
         self.timer.print_end()
         self.timer.print_total_elapsed()
@@ -212,11 +359,32 @@ class Runner(object):
         # Return #
         return self.output
 
+    def estimate(self, model=None):
+        """
+        Predict the time in seconds and the peak memory in MiB of the
+        simulation, without running it (see `Estimator`).
+        """
+        return self.estimator(model)
+
+    def rebase(self, data_dir):
+        """
+        Point this runner to another directory, such as a staging directory.
+        The compositions that have paths are recreated when next accessed,
+        except the logger, so that the log file stays open.
+        """
+        self.data_dir = data_dir
+        self.paths = AutoPaths(self.data_dir, self.all_paths)
+        cache = self.__dict__.get('__cache__', {})
+        for name, value in list(cache.items()):
+            if name != 'log' and hasattr(value, 'paths'): del cache[name]
+
     def remove_directories(self):
         """
         Removes the directory that will be recreated by running this runner.
         This guarantees that all output data is regenerated.
         Note: we need to keep the log we are writing to currently.
+        When the run is staged, these are the new and empty directories of
+        the staging area, and the published results are not touched.
         """
         # Message #
         self.log.info("Removing directory '%s'." % self.data_dir.with_tilda)
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Written by Lucas Sinclair and Paul Rougieux.
+
+JRC Biomass Project.
+Unit D1 Bioeconomy.
+"""
+
+# Built-in modules #
+import os, time, shutil, tempfile
+
+# Third party modules #
+
+# First party modules #
+
+# Internal modules #
+
+###############################################################################
+class Staging(object):
+    """
+    Every run writes its input and output data to a new staging directory
+    instead of deleting and regenerating the data of the previous run in
+    place. Only when the run succeeds are the new directories published,
+    by atomically replacing the `input` and `output` symbolic links of the
+    runner directory:
+
+        combos/historical/LU/0/input  -> .runs/20240101-120000-42-x1/input
+        combos/historical/LU/0/output -> .runs/20240101-120000-42-x1/output
+        combos/historical/LU/0/logs/
+
+    A crash leaves the previous results untouched, and anyone reading the
+    results always sees a complete run. The previous version is kept for a
+    while so that readers that started before the swap can finish.
+
+    The log files written during the run, such as the telemetry, are also
+    staged and moved into the `logs` directory on success, replacing the
+    ones of the previous run. Only `runner.log` itself is written in place.
+    When the run fails, they are moved to `logs/failed/` instead, so that
+    the telemetry and mass balance explaining the failure are kept.
+
+    Where symbolic links cannot be created, such as on Windows without the
+    developer mode, the run is written in place as before and a crash
+    loses the previous results.
+
+    An advisory lock on the runner directory ensures that two processes
+    never run the same runner at the same time. Used like this:
+
+        >>> with runner.staging:
+        >>>     ...
+        >>>     runner.staging.commit()
+
+    The `open` and `close` methods can also be called separately, when the
+    end of the run happens in another thread (see `BackgroundWriter`).
+    """
+
+    # The directories that are staged and swapped into place #
+    staged = ['input', 'output']
+
+    # How many previous versions to keep besides the current one #
+    keep = 1
+
+    # If symbolic links work, tested once per process #
+    _symlinks = None
+
+    def __init__(self, parent):
+        # Default attributes #
+        self.parent = parent
+        self.runner = parent
+        # The published directory #
+        self.base_dir  = self.runner.data_dir
+        self.runs_dir  = self.base_dir + '.runs/'
+        self.lock_path = self.base_dir + '.lock'
+        # Set when entering #
+        self.handle    = None
+        self.stage_dir = None
+        self.committed = False
+
+    def __repr__(self):
+        return '%s object code "%s"' % (self.__class__, self.runner.short_name)
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    #----------------------------- Properties --------------------------------#
+    @property
+    def symlinks(self):
+        """Can symbolic links be created on this system."""
+        if Staging._symlinks is None:
+            with tempfile.TemporaryDirectory() as tmp:
+                try:
+                    os.symlink(tmp, os.path.join(tmp, 'link'))
+                    Staging._symlinks = True
+                except (OSError, NotImplementedError):
+                    Staging._symlinks = False
+        return Staging._symlinks
+
+    #------------------------------- Methods ---------------------------------#
+    def open(self):
+        """Lock the runner, create a staging directory and point to it."""
+        # Only one process per runner #
+        self.acquire()
+        self.stage_dir = None
+        self.committed = False
+        # Without symbolic links the run is written in place #
+        if not self.symlinks:
+            msg = "Symbolic links are not available, writing in place."
+            self.runner.log.warning(msg)
+            return
+        # Create a new directory and point the runner to it #
+        try:
+            self.stage_dir = self.create()
+            self.runner.rebase(self.stage_dir)
+        except BaseException:
+            self.release()
+            raise
+
+    def close(self):
+        """Point the runner back to the published directory and unlock."""
+        try:
+            if self.stage_dir is None: return
+            self.runner.rebase(self.base_dir)
+            # Nothing was published, the previous results stay #
+            if not self.committed: self.discard()
+        finally:
+            self.release()
+
+    def acquire(self):
+        """Take the advisory lock of the runner directory, or fail."""
+        os.makedirs(str(self.base_dir), exist_ok=True)
+        self.handle = open(str(self.lock_path), 'w')
+        # Locks are only available on POSIX systems #
+        try: import fcntl
+        except ImportError: return
+        try:
+            fcntl.flock(self.handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self.handle.close()
+            self.handle = None
+            msg = "Runner '%s' is already running in another process."
+            raise Exception(msg % self.runner.short_name)
+
+    def release(self):
+        """Closing the file releases the lock."""
+        if self.handle is None: return
+        self.handle.close()
+        self.handle = None
+
+    def create(self):
+        """Make a new staging directory with its own `logs` directory."""
+        # A unique name that sorts by time #
+        stamp = '%s-%i-' % (time.strftime('%Y%m%d-%H%M%S'), os.getpid())
+        os.makedirs(str(self.runs_dir), exist_ok=True)
+        stage_dir = tempfile.mkdtemp(prefix=stamp, dir=str(self.runs_dir))
+        stage_dir = self.runs_dir + os.path.basename(stage_dir) + '/'
+        # The logs #
+        os.makedirs(os.path.join(str(stage_dir), 'logs'))
+        # Message #
+        self.runner.log.info("Staging the run in '%s'." % stage_dir)
+        # Return #
+        return stage_dir
+
+    def commit(self):
+        """Atomically publish the staged directories."""
+        # Written in place, nothing to do #
+        if self.stage_dir is None:
+            self.committed = True
+            return
+        # Message #
+        self.runner.log.info("Publishing the staged run.")
+        base = str(self.base_dir)
+        # The logs of this run replace the ones of the previous run #
+        self.publish_logs()
+        for name in self.staged:
+            target = os.path.join(str(self.stage_dir), name)
+            os.makedirs(target, exist_ok=True)
+            link = os.path.join(base, name)
+            # A plain directory left by an older version is moved aside #
+            if os.path.isdir(link) and not os.path.islink(link):
+                aside = os.path.join(str(self.runs_dir), 'old-' + name)
+                shutil.rmtree(aside, ignore_errors=True)
+                os.rename(link, aside)
+            # Replacing a link by another is atomic #
+            tmp = os.path.join(base, '.%s.%i.tmp' % (name, os.getpid()))
+            os.symlink(os.path.relpath(target, base), tmp)
+            os.replace(tmp, link)
+        # Remember #
+        self.committed = True
+        # Remove old versions #
+        self.prune()
+
+    def publish_logs(self):
+        """
+        Move the files in the staged `logs` directory to the published one,
+        after removing the files of the previous run except `runner.log`.
+        """
+        source = os.path.join(str(self.stage_dir), 'logs')
+        target = os.path.join(str(self.base_dir), 'logs')
+        os.makedirs(target, exist_ok=True)
+        # Remove the previous ones #
+        log = os.path.basename(str(self.runner.paths.log))
+        for name in os.listdir(target):
+            if name == log: continue
+            path = os.path.join(target, name)
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else: os.remove(path)
+        # Move the new ones #
+        for name in os.listdir(source):
+            if name == log: continue
+            os.replace(os.path.join(source, name), os.path.join(target, name))
+
+    def discard(self):
+        """
+        Remove the staging directory of a failed run, after moving its log
+        files to `logs/failed/`, replacing those of a previous failure.
+        """
+        if self.stage_dir is None: return
+        source = os.path.join(str(self.stage_dir), 'logs')
+        target = os.path.join(str(self.base_dir), 'logs', 'failed')
+        log    = os.path.basename(str(self.runner.paths.log))
+        try:
+            shutil.rmtree(target, ignore_errors=True)
+            os.makedirs(target, exist_ok=True)
+            names = os.listdir(source) if os.path.isdir(source) else []
+            for name in names:
+                if name == log: continue
+                shutil.move(os.path.join(source, name),
+                            os.path.join(target, name))
+        finally:
+            shutil.rmtree(str(self.stage_dir), ignore_errors=True)
+
+    def prune(self):
+        """
+        Remove the versions that are not published anymore, except the
+        most recent ones. This also removes the staging directories left
+        by runs that crashed, as we hold the lock.
+        """
+        base = str(self.base_dir)
+        runs = str(self.runs_dir)
+        # The versions currently published #
+        current = set()
+        for name in self.staged:
+            link = os.path.join(base, name)
+            if os.path.islink(link):
+                target = os.path.join(base, os.readlink(link))
+                current.add(os.path.basename(os.path.dirname(target)))
+        # The others, most recent first #
+        others = [d for d in os.listdir(runs) if d not in current]
+        others.sort(key=lambda d: os.path.getmtime(os.path.join(runs, d)),
+                    reverse=True)
+        # Remove #
+        for name in others[self.keep:]:
+            shutil.rmtree(os.path.join(runs, name), ignore_errors=True)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Written by Lucas Sinclair and Paul Rougieux.
+
+JRC Biomass Project.
+Unit D1 Bioeconomy.
+
+A transparent binary cache for the CSV files of the countries. The first
+time a CSV is read, the parsed data frame is also saved as a pickle in a
+per-user cache directory, keyed by the absolute path of the CSV. The
+following reads, in any process and any combo, load the pickle instead of
+parsing the text again. Nothing is written inside the data repository,
+and pickles are only loaded from a directory that only the current user
+can write to.
+
+The CSV files stay the source of truth. A cached file is used only if the
+CSV has the same modification time and size as when it was cached. If
+only the modification time changed, the content hash is compared before
+parsing again. The options passed to `pandas.read_csv`, such as `dtype`,
+are part of the cache key.
+
+Usage:
+
+    >>> from libcbm_runner.info.csv_cache import csv_cache
+    >>> df = csv_cache.read(path)
+
+The cache is in `~/.cache/libcbm_runner/csv/` by default, or under
+`$XDG_CACHE_HOME` or `%LOCALAPPDATA%` when set. The environment variable
+`LIBCBM_CSV_CACHE` can point to another directory. Set the environment
+variable `LIBCBM_NO_CSV_CACHE` to disable the cache.
+"""
+
+# Built-in modules #
+import os, pickle, hashlib, tempfile
+
+# Third party modules #
+import pandas
+
+# First party modules #
+
+# Internal modules #
+
+###############################################################################
+class CSVCache(object):
+    """Read CSV files through a cache of pickled data frames."""
+
+    # The name of the directory that older versions created next to the
+    # originals, still skipped when copying or hashing country files #
+    dir_name = '.cache'
+
+    # Bump this to invalidate all caches when the format changes #
+    version = 2
+
+    def __init__(self, enabled=True, cache_dir=None):
+        self.enabled   = enabled
+        self.cache_dir = cache_dir or self.default_dir()
+
+    def __repr__(self):
+        return '%s object (enabled: %s)' % (self.__class__, self.enabled)
+
+    #------------------------------- Methods ---------------------------------#
+    @staticmethod
+    def default_dir():
+        """The cache directory of the current user."""
+        if os.environ.get('LIBCBM_CSV_CACHE'):
+            return os.path.expanduser(os.environ['LIBCBM_CSV_CACHE'])
+        if os.name == 'nt': base = os.environ.get('LOCALAPPDATA', '~')
+        else: base = os.environ.get('XDG_CACHE_HOME', '~/.cache')
+        return os.path.join(os.path.expanduser(base), 'libcbm_runner', 'csv')
+
+    @staticmethod
+    def file_hash(path):
+        """Compute the md5 of a file by reading it in blocks."""
+        md5 = hashlib.md5()
+        with open(path, 'rb') as handle:
+            for block in iter(lambda: handle.read(1 << 20), b""):
+                md5.update(block)
+        return md5.hexdigest()
+
+    def cache_path(self, path, kwargs):
+        """Where the cached version of a CSV with these options is kept."""
+        path    = os.path.realpath(path)
+        options = repr(sorted(kwargs.items())) + str(self.version)
+        key = hashlib.md5((path + options).encode()).hexdigest()
+        name = '%s.%s.pkl' % (os.path.basename(path), key)
+        return os.path.join(self.cache_dir, name)
+
+    def read(self, path, **kwargs):
+        """
+        Return the same data frame as `pandas.read_csv(path, **kwargs)`,
+        using the cache when it is valid.
+        """
+        # The original #
+        path = str(path)
+        # Skip when disabled or when the file is empty #
+        if not self.enabled or os.environ.get('LIBCBM_NO_CSV_CACHE'):
+            return pandas.read_csv(path, **kwargs)
+        stat = os.stat(path)
+        if stat.st_size == 0: return pandas.read_csv(path, **kwargs)
+        # Try the cache #
+        cached = self.cache_path(path, kwargs)
+        entry  = self.load(cached)
+        if entry is not None:
+            # Nothing changed #
+            if entry['mtime'] == stat.st_mtime_ns and \
+               entry['size']  == stat.st_size:
+                return entry['df']
+            # The file was touched but has the same content #
+            if entry['size'] == stat.st_size and \
+               entry['md5']  == self.file_hash(path):
+                entry['mtime'] = stat.st_mtime_ns
+                self.dump(cached, entry)
+                return entry['df']
+        # Parse and save #
+        df = pandas.read_csv(path, **kwargs)
+        entry = {'mtime': stat.st_mtime_ns,
+                 'size':  stat.st_size,
+                 'md5':   self.file_hash(path),
+                 'df':    df}
+        self.dump(cached, entry)
+        # Return #
+        return df
+
+    @staticmethod
+    def load(cached):
+        """Load a cache entry, or return None if it is missing or broken."""
+        try:
+            with open(cached, 'rb') as handle: return pickle.load(handle)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError):
+            return None
+
+    @staticmethod
+    def dump(cached, entry):
+        """
+        Write a cache entry atomically, so that several processes reading
+        the same country never see a partial file. Failures are ignored,
+        for instance on a read-only file system. The temporary file is
+        always removed.
+        """
+        directory = os.path.dirname(cached)
+        tmp = None
+        try:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            handle, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(handle, 'wb') as stream:
+                pickle.dump(entry, stream, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, cached)
+            tmp = None
+        except OSError:
+            pass
+        finally:
+            if tmp is not None and os.path.exists(tmp): os.remove(tmp)
+
+###############################################################################
+# Create singleton #
+csv_cache = CSVCache()
@@ -17,6 +17,7 @@ import pandas
 from autopaths.auto_paths import AutoPaths
 
 # Internal modules #
+from libcbm_runner.info.csv_cache import csv_cache
 
 ###############################################################################
 class InputData:
@@ -85,47 +86,60 @@ class InputData:
         # The common static files just need to be copied over #
         common = self.orig.paths.common_dir
         common.copy(csv_dir)
+        # But not a cache left there by older versions #
+        (csv_dir + csv_cache.dir_name + '/').remove()
         # Create the four dynamic files #
         for input_file in self.orig.files_to_be_generated:
             # The path to the file that we will create #
             out_path = self.paths[input_file]
-            # What scenarios choices were made for this input file #
-            choices = getattr(self.combo, input_file, {})
-            # Initialize #
-            result = pandas.DataFrame()
-            # Optional debug message #
-            msg = "Input file '%s' and combo '%s' for country '%s':"
-            params = (input_file, self.combo.short_name, self.code)
-            if debug: print(msg % params)
-            # Iterate over every activity that is defined #
-            for activity in choices:
-                # Check it exists #
-                if activity not in self.orig.activities:
-                    msg = "The activity '%s' is not defined in '%s'."
-                    raise FileNotFoundError(msg % (activity, self.act_dir))
-                # Get the path to the file we will read #
-                in_path = self.act_dir + activity + '/' + input_file + '.csv'
-                # Read the file #
-                try:
-                    df = pandas.read_csv(str(in_path))
-                except (FileNotFoundError, pandas.errors.EmptyDataError):
-                    continue
-                # The scenario chosen for this activity and this input #
-                scenario = choices[activity]
-                # Filter rows to take only this scenario #
-                df = df.query("scenario == '%s'" % scenario)
-                # Optional debug message #
-                msg = "   * for activity '%s', scenario '%s': %i rows"
-                if debug: print(msg % (activity, scenario, len(df)))
-                # Append #
-                result = result.append(df)
-            # Remove the scenario column #
-            if not result.empty: result = result.drop(columns=['scenario'])
-            # Optional debug message #
-            if debug: print("   * result -> %i rows total\n" % len(result))
+            # Combine the activities #
+            result = self.make(input_file, debug)
             # Write output #
             result.to_csv(str(out_path), index=False)
         # Filter the rows for the `extras` files #
         pass
         # Return #
         return csv_dir
+
+    def make(self, input_file, debug=False):
+        """
+        Return the data frame of one of the dynamic input files, built from
+        the scenario chosen for each different activity, without writing it
+        to disk.
+        """
+        # What scenarios choices were made for this input file #
+        choices = getattr(self.combo, input_file, {})
+        # Initialize #
+        result = pandas.DataFrame()
+        # Optional debug message #
+        msg = "Input file '%s' and combo '%s' for country '%s':"
+        params = (input_file, self.combo.short_name, self.code)
+        if debug: print(msg % params)
+        # Iterate over every activity that is defined #
+        for activity in choices:
+            # Check it exists #
+            if activity not in self.orig.activities:
+                msg = "The activity '%s' is not defined in '%s'."
+                raise FileNotFoundError(msg % (activity, self.act_dir))
+            # Get the path to the file we will read #
+            in_path = self.act_dir + activity + '/' + input_file + '.csv'
+            # Read the file #
+            try:
+                df = csv_cache.read(in_path)
+            except (FileNotFoundError, pandas.errors.EmptyDataError):
+                continue
+            # The scenario chosen for this activity and this input #
+            scenario = choices[activity]
+            # Filter rows to take only this scenario #
+            df = df.query("scenario == '%s'" % scenario)
+            # Optional debug message #
+            msg = "   * for activity '%s', scenario '%s': %i rows"
+            if debug: print(msg % (activity, scenario, len(df)))
+            # Append #
+            result = result.append(df)
+        # Remove the scenario column #
+        if not result.empty: result = result.drop(columns=['scenario'])
+        # Optional debug message #
+        if debug: print("   * result -> %i rows total\n" % len(result))
+        # Return #
+        return result
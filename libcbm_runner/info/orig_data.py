@@ -18,6 +18,7 @@ from autopaths.auto_paths import AutoPaths
 from plumbing.cache import property_cached
 
 # Internal modules #
+from libcbm_runner.info.csv_cache import csv_cache
 
 ###############################################################################
 class OrigData(object):
@@ -63,7 +64,7 @@ class OrigData(object):
         self.paths = AutoPaths(self.parent.data_dir, self.all_paths)
 
     def __getitem__(self, item):
-        return pandas.read_csv(str(self.paths[item]))
+        return csv_cache.read(self.paths[item])
 
     #----------------------------- Properties --------------------------------#
     @property_cached
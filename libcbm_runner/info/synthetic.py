@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Written by Lucas Sinclair and Paul Rougieux.
+
+JRC Biomass Project.
+Unit D1 Bioeconomy.
+
+Generates the data directory of an imaginary country of any size, with the
+same layout as the real countries of the `libcbm_data` repository, to test
+how the pipeline scales. Usage:
+
+    >>> from libcbm_runner.info.synthetic import SyntheticCountry
+    >>> country = SyntheticCountry('XL', inventory_rows=2000000, seed=1)
+    >>> country.write('/tmp/libcbm_scratch/')
+
+The country code and its reference year are added to the common files of
+the data directory if they are missing. Since every country directory is
+picked up by the continent and run by every combo, writing to the real
+data directory `libcbm_data_dir` is refused unless `force` is set. Point
+the `LIBCBM_DATA` environment variable to the scratch directory to run
+the synthetic countries.
+"""
+
+# Built-in modules #
+import os, sqlite3
+
+# Third party modules #
+import numpy, pandas
+
+# First party modules #
+from autopaths.dir_path import DirectoryPath
+
+# Internal modules #
+from libcbm_runner                    import libcbm_data_dir
+from libcbm_runner.info.aidb          import aidb_repo
+from libcbm_runner.pump.column_order  import events_cols
+
+###############################################################################
+class SyntheticCountry(object):
+    """
+    Writes a complete country directory: common files, the activities with
+    their scenarios, events in the wide format, associations and a symbolic
+    link to an AIDB. The AIDB is also read to pick spatial units, species
+    and disturbance types that exist in it, so that the country can be
+    simulated by `libcbm`.
+
+    Everything is drawn from a random generator with a fixed seed, so that
+    the same parameters always give the same files.
+    """
+
+    # The classifiers, in order, as in the real countries #
+    classifiers = ['status', 'forest_type', 'region', 'mgmt_type',
+                   'mgmt_strategy', 'climate', 'con_broad', 'site_index',
+                   'growth_period']
+
+    # The activities that the combos expect #
+    activities = ['afforestation', 'deforestation', 'mgmt', 'nd_nsr', 'nd_sr']
+
+    # The width and number of the age classes #
+    age_class_size = 10
+    num_age_classes = 30
+
+    def __init__(self, code='ZX', inventory_rows=10000, species=6,
+                 regions=4, mgmt_types=2, mgmt_strategies=2, site_indexes=3,
+                 event_rows=200, event_density=0.5, start_year=1999,
+                 end_year=2015, scenarios=('reference',), aidb=None, seed=0):
+        # The country #
+        self.code       = code
+        self.start_year = start_year
+        self.end_year   = end_year
+        # Sizes #
+        self.inventory_rows  = inventory_rows
+        self.num_species     = species
+        self.num_regions     = regions
+        self.mgmt_types      = mgmt_types
+        self.mgmt_strategies = mgmt_strategies
+        self.site_indexes    = site_indexes
+        # Events #
+        self.event_rows    = event_rows
+        self.event_density = event_density
+        self.scenarios     = list(scenarios)
+        # The AIDB that will be linked #
+        self.aidb = aidb or (aidb_repo + 'aidb.db')
+        # Reproducible, the generator is created again by every `write` #
+        self.seed = seed
+
+    def __repr__(self):
+        msg = '%s object code "%s" with %i inventory rows'
+        return msg % (self.__class__, self.code, self.inventory_rows)
+
+    #----------------------------- Properties --------------------------------#
+    @property
+    def years(self):
+        """The years that can have events."""
+        return list(range(self.start_year + 1, self.end_year + 1))
+
+    @property
+    def aidb_names(self):
+        """
+        Read the names of the spatial units, species and disturbance types
+        from the AIDB, or make up names if the AIDB is missing.
+        """
+        # Without an AIDB #
+        if not os.path.exists(str(self.aidb)):
+            return {'units':   [('Admin %i' % i, 'Eco %i' % i)
+                                for i in range(self.num_regions)],
+                    'species': ['Species %i' % i
+                                for i in range(self.num_species)],
+                    'dist':    ['Wildfire', 'Clearcut harvesting']}
+        # Read the tables of names #
+        def names(con, table, key):
+            df = pandas.read_sql_query('SELECT * FROM %s' % table, con)
+            if 'locale_id' in df.columns: df = df[df['locale_id'] == 1]
+            return df.set_index(key)['name']
+        with sqlite3.connect(str(self.aidb)) as con:
+            admin   = names(con, 'admin_boundary_tr',   'admin_boundary_id')
+            eco     = names(con, 'eco_boundary_tr',     'eco_boundary_id')
+            species = names(con, 'species_tr',          'species_id')
+            dist    = names(con, 'disturbance_type_tr', 'disturbance_type_id')
+            units   = pandas.read_sql_query('SELECT * FROM spatial_unit', con)
+        # Spatial units are pairs of an admin and an eco boundary #
+        units = list(zip(units['admin_boundary_id'].map(admin),
+                         units['eco_boundary_id'].map(eco)))
+        # A fire for the spin-up and a clear-cut for the events #
+        fire = [n for n in dist if 'fire' in n.lower()][:1]
+        cut  = [n for n in dist if 'clearcut' in n.lower().replace(' ', '')
+                or 'clear-cut' in n.lower()][:1]
+        # Return #
+        return {'units':   units[:self.num_regions],
+                'species': list(species)[:self.num_species],
+                'dist':    (fire or list(dist)[:1]) + (cut or list(dist)[1:2])}
+
+    #------------------------------- Methods ---------------------------------#
+    def values(self):
+        """The values of every classifier."""
+        # There might be fewer in the AIDB than asked for #
+        n = max(len(self.names['units']), 1)
+        s = max(len(self.names['species']), 1)
+        return {
+            'status':        ['For', 'NF'],
+            'forest_type':   ['SP%i' % i for i in range(s)],
+            'region':        ['R%02i' % i for i in range(n)],
+            'mgmt_type':     ['M%i' % i for i in range(self.mgmt_types)],
+            'mgmt_strategy': ['S%i' % i for i in range(self.mgmt_strategies)],
+            'climate':       ['C%02i' % i for i in range(n)],
+            'con_broad':     ['con', 'broad'],
+            'site_index':    ['SI%i' % i for i in range(self.site_indexes)],
+            'growth_period': ['Init', 'Cur'],
+        }
+
+    def write(self, data_dir, force=False):
+        """Write all the files of the country in a data directory."""
+        # Directories #
+        data_dir    = DirectoryPath(data_dir)
+        # Never mix with the real countries by accident #
+        real = os.path.realpath(os.path.expanduser(str(libcbm_data_dir)))
+        if not force and os.path.realpath(str(data_dir)) == real:
+            msg = "Refusing to write a synthetic country in the real data " \
+                  "directory '%s', use a scratch directory or `force`."
+            raise ValueError(msg % libcbm_data_dir)
+        # The same files every time #
+        self.rng = numpy.random.default_rng(self.seed)
+        country_dir = data_dir + 'countries/' + self.code + '/'
+        for sub in ['common', 'config', 'extras'] + \
+                   ['activities/' + a for a in self.activities]:
+            os.makedirs(str(country_dir + sub), exist_ok=True)
+        # The names from the AIDB #
+        self.names = self.aidb_names
+        self.vals  = self.values()
+        # Common files #
+        common = country_dir + 'common/'
+        self.age_classes().to_csv(str(common + 'age_classes.csv'), index=False)
+        self.classifiers_df().to_csv(str(common + 'classifiers.csv'),
+                                     index=False)
+        self.disturbance_types().to_csv(str(common + 'disturbance_types.csv'),
+                                        index=False)
+        # Config #
+        config = country_dir + 'config/'
+        self.associations().to_csv(str(config + 'associations.csv'),
+                                   index=False)
+        link = str(config + 'aidb.db')
+        if os.path.lexists(link): os.remove(link)
+        os.symlink(os.path.abspath(os.path.expanduser(str(self.aidb))), link)
+        # The management activity holds everything #
+        mgmt = country_dir + 'activities/mgmt/'
+        inventory = self.inventory()
+        frames = {'inventory':     inventory,
+                  'growth_curves': self.growth_curves(),
+                  'transitions':   self.transitions(),
+                  'events':        self.events(inventory['area'].sum())}
+        for name, df in frames.items():
+            copies = [df.copy() for s in self.scenarios]
+            for s, copy in zip(self.scenarios, copies):
+                copy.insert(0, 'scenario', s)
+            df = pandas.concat(copies)
+            df.to_csv(str(mgmt + name + '.csv'), index=False)
+        # Register the country code #
+        self.register(data_dir)
+        # Return #
+        return country_dir
+
+    def age_classes(self):
+        """The age classes in the SIT format."""
+        ids   = ['AGEID%i' % i for i in range(self.num_age_classes + 1)]
+        sizes = [0] + [self.age_class_size] * self.num_age_classes
+        return pandas.DataFrame({'id': ids, 'size': sizes})
+
+    def classifiers_df(self):
+        """The classifiers and their values."""
+        rows = []
+        for number, name in enumerate(self.classifiers, 1):
+            rows.append((number, '_CLASSIFIER', name))
+            rows += [(number, value, value) for value in self.vals[name]]
+        return pandas.DataFrame(rows, columns=['classifier_number',
+                                               'classifier_value_id',
+                                               'name'])
+
+    def disturbance_types(self):
+        """The spin-up disturbance first and the harvest second."""
+        names = self.names['dist']
+        ids   = ['DISTID%i' % i for i in range(1, len(names) + 1)]
+        return pandas.DataFrame({'id': ids, 'name': names})
+
+    def associations(self):
+        """Link the classifier values to the names of the AIDB."""
+        rows  = [('MapAdminBoundary', r, a) for r, (a, e) in
+                 zip(self.vals['region'], self.names['units'])]
+        rows += [('MapEcoBoundary', c, e) for c, (a, e) in
+                 zip(self.vals['climate'], self.names['units'])]
+        rows += [('MapSpecies', s, n) for s, n in
+                 zip(self.vals['forest_type'], self.names['species'])]
+        rows += [('MapDisturbanceType', n, n) for n in self.names['dist']]
+        return pandas.DataFrame(rows, columns=['category', 'name_input',
+                                               'name_aidb'])
+
+    def pick(self, name, size):
+        """Draw random values of a classifier."""
+        return self.rng.choice(self.vals[name], size=size)
+
+    def inventory(self):
+        """One row per stand, with a random age and area."""
+        n = self.inventory_rows
+        df = pandas.DataFrame({'status': 'For'}, index=range(n))
+        species = self.rng.integers(len(self.vals['forest_type']), size=n)
+        unit    = self.rng.integers(len(self.vals['region']), size=n)
+        df['forest_type']   = numpy.array(self.vals['forest_type'])[species]
+        df['region']        = numpy.array(self.vals['region'])[unit]
+        df['mgmt_type']     = self.pick('mgmt_type', n)
+        df['mgmt_strategy'] = self.pick('mgmt_strategy', n)
+        # The climate must form a spatial unit with the region #
+        df['climate']       = numpy.array(self.vals['climate'])[unit]
+        df['con_broad']     = numpy.where(species % 2, 'broad', 'con')
+        df['site_index']    = self.pick('site_index', n)
+        df['growth_period'] = 'Init'
+        # The age and area #
+        df['using_id']  = False
+        df['age']       = self.rng.integers(0, 150, size=n)
+        df['area']      = self.rng.lognormal(3, 1, size=n).round(2)
+        df['delay']     = 0
+        df['unfcccl']   = 0
+        df['hist_dist'] = 'DISTID1'
+        df['last_dist'] = 'DISTID1'
+        # Return #
+        return df
+
+    def growth_curves(self):
+        """
+        One curve per species, site index and growth period, with wildcards
+        for the other classifiers. The volume follows a Chapman-Richards
+        curve whose maximum depends on the site index.
+        """
+        ages = numpy.arange(self.num_age_classes + 1) * self.age_class_size
+        rows = []
+        for i, species in enumerate(self.vals['forest_type']):
+            for j, site in enumerate(self.vals['site_index']):
+                vmax = 250 + 150 * j
+                vols = vmax * (1 - numpy.exp(-0.03 * ages)) ** 3
+                for period in self.vals['growth_period']:
+                    row = dict.fromkeys(self.classifiers, '?')
+                    row.update(forest_type   = species,
+                               con_broad     = ['con', 'broad'][i % 2],
+                               site_index    = site,
+                               growth_period = period,
+                               sp            = species)
+                    row.update(('vol%i' % k, round(v, 2))
+                               for k, v in enumerate(vols))
+                    rows.append(row)
+        return pandas.DataFrame(rows)
+
+    def transitions(self):
+        """Stands cut by the harvest regenerate with the same classifiers."""
+        n = len(self.classifiers)
+        columns  = self.classifiers + ['using_id', 'sw_start', 'sw_end',
+                                       'hw_start', 'hw_end', 'dist_type']
+        columns += self.classifiers + ['regen_delay', 'reset_age', 'percent']
+        row = ['?'] * n + [False, 0, 999, 0, 999, 'DISTID2'] + \
+              ['?'] * n + [0, 0, 100]
+        return pandas.DataFrame([row], columns=columns)
+
+    def events(self, total_area):
+        """
+        Harvest events in the wide format, one column per year. Each row
+        targets random classifier values, with wildcards elsewhere, and has
+        an amount in a share `event_density` of the years.
+        """
+        n = self.event_rows
+        df = pandas.DataFrame(index=range(n))
+        for col in events_cols:
+            if col in ('amount', 'step'): continue
+            df[col] = -1
+        # Classifiers #
+        for name in self.classifiers: df[name] = '?'
+        df['status']      = 'For'
+        df['forest_type'] = self.pick('forest_type', n)
+        df['region']      = self.pick('region', n)
+        # Criteria #
+        df['using_id'] = False
+        df['sw_start'], df['sw_end'] = 40, 999
+        df['hw_start'], df['hw_end'] = 40, 999
+        df['efficiency']       = 1.0
+        df['sort_type']        = 1
+        df['measurement_type'] = 'A'
+        df['dist_type_name']   = 'DISTID2'
+        # Amounts, in hectares #
+        amount = total_area * 0.01 / max(n, 1)
+        for year in self.years:
+            cut = self.rng.random(n) < self.event_density
+            values = self.rng.uniform(0.5, 1.5, size=n) * amount
+            df['amount_%i' % year] = numpy.where(cut, values.round(2),
+                                                 numpy.nan)
+        # Return #
+        return df
+
+    def register(self, data_dir):
+        """Add the country code and its reference year if they are missing."""
+        common = data_dir + 'common/'
+        os.makedirs(str(common), exist_ok=True)
+        # The codes #
+        codes = {'iso2_code': self.code, 'country_code': 999,
+                 'country': 'Synthetic %s' % self.code, 'm49_code': 999,
+                 'iso3_code': self.code + 'X', 'nuts_zero_2006': self.code,
+                 'nuts_zero_2010': self.code}
+        years = {'country': self.code, 'ref_year': self.start_year}
+        # Append to both files #
+        for name, row, key in [('country_codes.csv',   codes, 'iso2_code'),
+                               ('reference_years.csv', years, 'country')]:
+            path = str(common + name)
+            if os.path.exists(path): df = pandas.read_csv(path)
+            else: df = pandas.DataFrame(columns=list(row))
+            df = df[df[key] != self.code]
+            df = pandas.concat([df, pandas.DataFrame([row])])
+            df.to_csv(path, index=False)
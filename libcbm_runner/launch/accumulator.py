@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Written by Lucas Sinclair and Paul Rougieux.
+
+JRC Biomass Project.
+Unit D1 Bioeconomy.
+"""
+
+# Built-in modules #
+
+# Third party modules #
+import numpy, pandas
+
+# First party modules #
+
+# Internal modules #
+
+###############################################################################
+class ArrayAccumulator(object):
+    """
+    A replacement for the in-memory reporting function of `libcbm`, which
+    appends one data frame per timestep and concatenates them at every
+    step. Here, every column of every table is stored in one contiguous
+    array of shape (num_timesteps + 1) x n_stands that is allocated on the
+    first timestep and filled in place afterwards. Memory use is therefore
+    known as soon as the first timestep is reported. Each column keeps the
+    type it has in `libcbm`, so that integer and boolean columns such as
+    `disturbance_type` or `enabled` stay integers and booleans, except that
+    floats are stored in the type of their table.
+
+    An instance is both the results object and the reporting function:
+
+        >>> results = ArrayAccumulator(num_timesteps=30)
+        >>> cbm_simulator.simulate(..., reporting_func=results)
+        >>> results.pools
+
+    Accessing a table such as `results.pools` returns a data frame whose
+    columns are views on the arrays, without copying, as long as the
+    number of stands did not change during the simulation. When
+    disturbances split stands, the stand axis grows and the rows are
+    gathered in a copy. The flux is not reported at timestep 0, its
+    frame starts at the first timestep reported.
+    """
+
+    # Tables that are recorded and their type when in single precision.
+    # Columns of another kind, such as integers in a table of floats, keep
+    # their own type #
+    dtypes = {'pools':       numpy.float32,
+              'flux':        numpy.float32,
+              'area':        numpy.float32,
+              'state':       numpy.float64,
+              'parameters':  numpy.float64,
+              'classifiers': numpy.int32}
+
+    # By how much the stand axis grows when it is full #
+    growth_factor = 1.5
+
+    def __init__(self, num_timesteps, density=False, single_precision=True):
+        # Base attributes #
+        self.num_steps        = int(num_timesteps) + 1
+        self.density          = density
+        self.single_precision = single_precision
+        # Will be filled as the simulation runs #
+        self.arrays  = {}
+        self.columns = {}
+        self.counts  = {}
+
+    def __repr__(self):
+        msg = '%s object with %i tables using %.1f MiB'
+        return msg % (self.__class__, len(self.arrays), self.nbytes / 2**20)
+
+    def __getattr__(self, name):
+        """Give access to the tables just like the libcbm namespace."""
+        if name in self.dtypes:
+            if name not in self.arrays: return None
+            return self.frame(name)
+        raise AttributeError(name)
+
+    #--------------------------- Special Methods -----------------------------#
+    def __call__(self, timestep, cbm_vars):
+        """This is the reporting function passed to the libcbm simulator."""
+        # The area of every stand #
+        area = cbm_vars.inventory['area'].to_numpy()
+        # Pools and flux are per hectare in libcbm #
+        pools = cbm_vars.pools
+        self.store('pools', timestep, pools, area)
+        # Flux can be missing #
+        flux = cbm_vars.flux
+        if flux is not None and len(flux.index) > 0:
+            self.store('flux', timestep, flux, area)
+        # The other tables are copied as they are #
+        self.store('state',       timestep, cbm_vars.state)
+        self.store('parameters',  timestep, cbm_vars.parameters)
+        self.store('classifiers', timestep, cbm_vars.classifiers)
+        self.store('area',        timestep, cbm_vars.inventory[['area']])
+
+    #----------------------------- Properties --------------------------------#
+    @property
+    def nbytes(self):
+        """The total memory used by all the arrays."""
+        return sum(array.nbytes for arrays in self.arrays.values()
+                   for array in arrays)
+
+    #------------------------------- Methods ---------------------------------#
+    def dtype(self, name):
+        """The numpy type used to store a given table."""
+        dtype = self.dtypes[name]
+        if not self.single_precision and dtype == numpy.float32:
+            return numpy.float64
+        return dtype
+
+    def column_dtype(self, name, dtype):
+        """The numpy type used to store one column of a given table."""
+        table = numpy.dtype(self.dtype(name))
+        if table.kind == dtype.kind: return table
+        return dtype
+
+    def allocate(self, name, df):
+        """Create the arrays of a table for all timesteps at once."""
+        shape = (self.num_steps, len(df.index))
+        self.arrays[name]  = [numpy.zeros(shape, self.column_dtype(name, t))
+                              for t in df.dtypes]
+        self.columns[name] = list(df.columns)
+        self.counts[name]  = numpy.zeros(self.num_steps, dtype=numpy.int64)
+
+    def grow(self, name, num_stands):
+        """
+        Enlarge the stand axis of a table when disturbances split stands.
+        The capacity grows geometrically so that this happens rarely.
+        """
+        arrays = self.arrays[name]
+        old    = arrays[0].shape[1]
+        capacity = max(num_stands, int(old * self.growth_factor))
+        for i, array in enumerate(arrays):
+            new = numpy.zeros((array.shape[0], capacity), dtype=array.dtype)
+            new[:, :old] = array
+            arrays[i] = new
+
+    def store(self, name, timestep, df, area=None):
+        """Copy the values of one table at one timestep into its array."""
+        # Number of stands #
+        num_stands = len(df.index)
+        # First time we see this table #
+        if name not in self.arrays: self.allocate(name, df)
+        arrays = self.arrays[name]
+        # Stands were split #
+        if num_stands > arrays[0].shape[1]: self.grow(name, num_stands)
+        # Fill in place, column by column #
+        for array, column in zip(arrays, self.columns[name]):
+            dest = array[timestep, :num_stands]
+            dest[:] = df[column].to_numpy(dtype=dest.dtype)
+            # Convert densities to masses #
+            if area is not None and not self.density: dest *= area
+        # Record how many stands were stored #
+        self.counts[name][timestep] = num_stands
+
+    def frame(self, name):
+        """
+        Return a table as a data frame in the same format as the one
+        produced by `libcbm`, with `identifier` and `timestep` columns.
+        """
+        arrays = self.arrays[name]
+        counts = self.counts[name]
+        # Only the timesteps that were reported #
+        steps  = numpy.flatnonzero(counts)
+        counts = counts[steps]
+        # When no stand was added and no timestep skipped, views suffice #
+        first, last = steps[0], steps[-1] + 1
+        full = numpy.all(counts == arrays[0].shape[1])
+        if full and len(steps) == last - first:
+            columns = [array[first:last].reshape(-1) for array in arrays]
+        else:
+            columns = [numpy.concatenate([array[t, :n]
+                                          for t, n in zip(steps, counts)])
+                       for array in arrays]
+        # Build the data frame without copying #
+        df = pandas.DataFrame(dict(zip(self.columns[name], columns)),
+                              copy=False)
+        # Add the two index columns #
+        identifiers = numpy.concatenate([numpy.arange(1, n+1) for n in counts])
+        df.insert(0, 'timestep',   numpy.repeat(steps, counts))
+        df.insert(0, 'identifier', identifiers)
+        # Return #
+        return df
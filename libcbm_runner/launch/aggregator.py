@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Written by Lucas Sinclair and Paul Rougieux.
+
+JRC Biomass Project.
+Unit D1 Bioeconomy.
+"""
+
+# Built-in modules #
+
+# Third party modules #
+import numpy, pandas
+
+# First party modules #
+
+# Internal modules #
+
+###############################################################################
+class GroupAggregator(object):
+    """
+    A reporting function for the `libcbm` simulator that does not keep any
+    per-stand data. At every timestep, the pools, fluxes and area of all
+    stands are summed by groups of classifiers (for instance region,
+    forest type and conifers/broadleaves). Only these sums are kept.
+
+    The classifier ids of every group-by dimension are converted once to
+    compact codes with a lookup table, so that at each timestep the group
+    of every stand is obtained with a single vectorized index computation
+    and the sums with `numpy.bincount`.
+
+        >>> results = GroupAggregator(sit.classifier_value_ids,
+        >>>                           ['region', 'forest_type'])
+        >>> cbm_simulator.simulate(..., reporting_func=results)
+        >>> results.pools
+    """
+
+    # The tables that are aggregated #
+    tables = ['pools', 'flux', 'area']
+
+    def __init__(self, classifier_value_ids, group_by, density=False):
+        # Base attributes #
+        self.group_by = list(group_by)
+        self.density  = density
+        # For every dimension, the value names and a lookup from ids #
+        self.values  = []
+        self.lookups = []
+        for name in self.group_by:
+            ids     = classifier_value_ids[name]
+            names   = list(ids.keys())
+            lookup  = numpy.full(max(ids.values()) + 1, -1, dtype=numpy.int64)
+            lookup[[ids[n] for n in names]] = numpy.arange(len(names))
+            self.values.append(numpy.array(names, dtype=object))
+            self.lookups.append(lookup)
+        # The size of every dimension #
+        self.dims = tuple(len(v) for v in self.values)
+        # Will be filled as the simulation runs #
+        self.chunks  = {name: [] for name in self.tables}
+        self.columns = {}
+
+    def __repr__(self):
+        return '%s object on %s' % (self.__class__, self.group_by)
+
+    def __getattr__(self, name):
+        """Give access to the tables just like the libcbm namespace."""
+        if name in self.tables: return self.frame(name)
+        raise AttributeError(name)
+
+    #--------------------------- Special Methods -----------------------------#
+    def __call__(self, timestep, cbm_vars):
+        """This is the reporting function passed to the libcbm simulator."""
+        # The group of every stand #
+        codes = cbm_vars.classifiers[self.group_by].to_numpy()
+        codes = [lookup[codes[:, i]] for i, lookup in enumerate(self.lookups)]
+        keys  = numpy.ravel_multi_index(codes, self.dims)
+        groups, inverse = numpy.unique(keys, return_inverse=True)
+        # The area of every stand #
+        area = cbm_vars.inventory['area'].to_numpy()
+        # Pools and flux are per hectare in libcbm #
+        weights = None if self.density else area
+        self.add('pools', timestep, cbm_vars.pools, groups, inverse, weights)
+        flux = cbm_vars.flux
+        if flux is not None and len(flux.index) > 0:
+            self.add('flux', timestep, flux, groups, inverse, weights)
+        self.add('area', timestep, cbm_vars.inventory[['area']],
+                 groups, inverse, None)
+
+    #------------------------------- Methods ---------------------------------#
+    def add(self, name, timestep, df, groups, inverse, weights):
+        """Sum one table by group and keep the result of this timestep."""
+        # Record column names #
+        self.columns.setdefault(name, list(df.columns))
+        # Get the values #
+        values = df.to_numpy(dtype=numpy.float64)
+        if weights is not None: values = values * weights[:, None]
+        # Sum every column by group #
+        sums = numpy.column_stack([
+            numpy.bincount(inverse, weights=values[:, j],
+                           minlength=len(groups))
+            for j in range(values.shape[1])])
+        # Keep #
+        self.chunks[name].append((timestep, groups, sums))
+
+    def frame(self, name):
+        """
+        Return one aggregated table as a data frame with one column per
+        group-by classifier, a timestep column and the summed values.
+        """
+        chunks = self.chunks[name]
+        if not chunks: return None
+        # Concatenate all timesteps #
+        steps  = numpy.concatenate([numpy.full(len(g), t) for t, g, _ in chunks])
+        groups = numpy.concatenate([g for _, g, _ in chunks])
+        sums   = numpy.concatenate([s for _, _, s in chunks])
+        # Build the data frame #
+        df = pandas.DataFrame(sums, columns=self.columns[name])
+        df.insert(0, 'timestep', steps)
+        # Decode the groups back to classifier values #
+        codes = numpy.unravel_index(groups, self.dims)
+        for i, clfr in reversed(list(enumerate(self.group_by))):
+            df.insert(0, clfr, self.values[i][codes[i]])
+        # Return #
+        return df
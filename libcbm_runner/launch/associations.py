@@ -11,12 +11,12 @@ Unit D1 Bioeconomy.
 # Built-in modules #
 
 # Third party modules #
-import pandas
 
 # First party modules #
 from plumbing.cache import property_cached
 
 # Internal modules #
+from libcbm_runner.info.csv_cache import csv_cache
 
 ###############################################################################
 class Associations(object):
@@ -37,7 +37,7 @@ class Associations(object):
         Load the CSV that is the original 'associations.csv' from cbmcfs3.
         The path is taken from the OrigData class.
         """
-        return pandas.read_csv(str(self.parent.orig_data.paths.associations))
+        return csv_cache.read(self.parent.orig_data.paths.associations)
 
     @property_cached
     def all_mappings(self):
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Written by Lucas Sinclair and Paul Rougieux.
+
+JRC Biomass Project.
+Unit D1 Bioeconomy.
+"""
+
+# Built-in modules #
+import csv
+
+# Third party modules #
+import numpy, pandas
+
+# First party modules #
+from autopaths.auto_paths import AutoPaths
+from plumbing.timer       import LogTimer
+
+# Internal modules #
+
+###############################################################################
+class Ensemble(object):
+    """
+    This class runs a Monte Carlo ensemble of a given runner inside a single
+    `libcbm` simulation. Instead of running the same runner many times,
+    each time paying for the setup, spin-up and I/O, the input data is
+    replicated once per ensemble member. An extra classifier called
+    `replicate` distinguishes the copies, and every copy receives its own
+    perturbation of the inputs.
+
+    The perturbation specification is a dictionary where each key is an
+    input file and each value is the range (low, high) from which a
+    multiplier is drawn uniformly for every member:
+
+        * `growth_curves`: multiplies the volumes of the growth curves.
+        * `events`:        multiplies the amount of every disturbance,
+                           proportions are capped at 1.
+        * `transitions`:   multiplies the percentage of every transition,
+                           capped at 100.
+
+    Example use:
+
+        >>> from libcbm_runner.core.continent import continent
+        >>> runner = continent.combos['historical'].runners['LU'][-1]
+        >>> spec = {'growth_curves': (0.9, 1.1), 'events': (0.8, 1.2)}
+        >>> runner.ensemble(num_members=50, spec=spec, seed=1)
+        >>> runner.ensemble.load('pools')
+
+    The output only contains the pools, fluxes and area summed over all the
+    stands of each member, for every timestep, not the per-stand tables.
+    The first member `r0` is the unperturbed reference unless
+    `include_reference` is set to False. Combos using the 'aggregate'
+    reporting or a `demand_harvest` cannot be run as ensembles.
+    """
+
+    all_paths = """
+    /output/ensemble/
+    /output/ensemble/members.csv
+    /output/ensemble/area.csv.gz
+    /output/ensemble/flux.csv.gz
+    /output/ensemble/pools.csv.gz
+    """
+
+    # The name of the extra classifier #
+    classifier = 'replicate'
+
+    # The input files that can be perturbed #
+    perturbable = ['growth_curves', 'events', 'transitions']
+
+    def __init__(self, parent):
+        # Default attributes #
+        self.parent = parent
+        self.runner = parent
+        # Directories #
+        self.paths = AutoPaths(self.parent.data_dir, self.all_paths)
+        # Shortcuts #
+        self.input = self.runner.input_data
+
+    def __repr__(self):
+        return '%s object code "%s"' % (self.__class__, self.runner.short_name)
+
+    def __getitem__(self, item):
+        return pandas.read_csv(str(self.paths[item]))
+
+    #--------------------------- Special Methods -----------------------------#
+    def __call__(self, num_members, spec, seed=None, include_reference=True,
+                 verbose=True, interrupt_on_error=False):
+        """
+        Run the full modelling pipeline once, with the inputs replicated
+        `num_members` times and perturbed according to `spec`.
+        """
+        # The members are told apart with the per-stand classifiers #
+        if self.runner.combo.reporting == 'aggregate':
+            msg = "Ensembles need the per-stand results, the combo '%s' " \
+                  "uses the 'aggregate' reporting."
+            raise ValueError(msg % self.runner.combo.short_name)
+        # The demand of the country would be shared by every member #
+        if self.runner.combo.demand_harvest:
+            msg = "Ensembles cannot replicate the harvest demand, the " \
+                  "combo '%s' uses `demand_harvest`."
+            raise ValueError(msg % self.runner.combo.short_name)
+        # Check the specification #
+        for key in spec:
+            if key not in self.perturbable:
+                msg = "Cannot perturb '%s', choose amongst %s."
+                raise ValueError(msg % (key, self.perturbable))
+        # Verbosity level #
+        self.runner.verbose = verbose
+        # Messages #
+        msg = "Runner '%s' starting an ensemble of %i members."
+        self.runner.log.info(msg % (self.runner.short_name, num_members))
+        # Start the timer #
+        self.timer = LogTimer(self.runner.log)
+        self.timer.print_start()
+        # Draw the multipliers of every member #
+        self.members = self.draw_members(num_members, spec, seed,
+                                         include_reference)
+        # Write to a new staging directory, published only on success #
+        self.runner.staging.open()
+        try:
+            self.rebase()
+            self.run(interrupt_on_error)
+            # Swap the new input and output into place #
+            if self.runner.simulation.error is not True:
+                self.runner.staging.commit()
+        finally:
+            self.runner.staging.close()
+            self.rebase()
+        # Messages #
+        self.timer.print_end()
+        self.timer.print_total_elapsed()
+        # Return #
+        return self.paths.ensemble_dir
+
+    #----------------------------- Properties --------------------------------#
+    @property
+    def names(self):
+        """The classifier values of every member, such as 'r0', 'r1'..."""
+        return list(self.members['member'])
+
+    #------------------------------- Methods ---------------------------------#
+    def rebase(self):
+        """Follow the runner to or from its staging directory."""
+        self.paths = AutoPaths(self.runner.data_dir, self.all_paths)
+        self.input = self.runner.input_data
+
+    def run(self, interrupt_on_error=False):
+        """Prepare the inputs, run the model and summarize the results."""
+        # Prepare the input data just like a normal run #
+        self.runner.remove_directories()
+        self.runner.input_data()
+        self.runner.modify_input()
+        self.runner.pre_processor()
+        # Replicate and perturb the input data #
+        self.replicate()
+        # Create the JSON configuration #
+        self.runner.create_json()
+        # Run the model #
+        self.timer.print_elapsed()
+        self.runner.simulation(interrupt_on_error)
+        self.timer.print_elapsed()
+        # Summarize the results by member #
+        if self.runner.simulation.error is not True: self.save()
+        # Free memory #
+        self.runner.simulation.clear()
+
+    def draw_members(self, num_members, spec, seed, include_reference):
+        """
+        Return a dataframe with one row per member and one column per
+        input file, containing the multipliers to apply.
+        """
+        # Random generator #
+        rng = numpy.random.RandomState(seed)
+        # Initialize #
+        df = pandas.DataFrame({'member': ['r%i' % i
+                                          for i in range(num_members)]})
+        # Draw #
+        for key in self.perturbable:
+            low, high = spec.get(key, (1.0, 1.0))
+            df[key] = rng.uniform(low, high, num_members)
+        # The first member can be the unperturbed reference #
+        if include_reference: df.loc[0, self.perturbable] = 1.0
+        # Return #
+        return df
+
+    def factors(self, key, num_rows):
+        """The multiplier of each row of a replicated input file."""
+        return numpy.repeat(self.members[key].values, num_rows)
+
+    def tile(self, df, position):
+        """
+        Repeat a dataframe once per member and insert the `replicate`
+        classifier column at the position given.
+        """
+        result = pandas.concat([df] * len(self.members), ignore_index=True)
+        values = numpy.repeat(self.names, len(df))
+        result.insert(position, self.classifier, values)
+        return result
+
+    def replicate(self):
+        """
+        Rewrite the input CSV files so that they contain every member.
+        Must be run after the pre-processor, when the events file is already
+        in the long format.
+        """
+        # Message #
+        msg = "Replicating the input data %i times."
+        self.runner.log.info(msg % len(self.members))
+        # The new classifier goes after all existing ones #
+        clfrs = self.input['classifiers']
+        num_clfrs = (clfrs['classifier_value_id'] == '_CLASSIFIER').sum()
+        number = clfrs['classifier_number'].max() + 1
+        # Add the classifier and one value per member #
+        header = [(number, '_CLASSIFIER', self.classifier)]
+        values = [(number, name, name) for name in self.names]
+        extra = pandas.DataFrame(header + values, columns=clfrs.columns)
+        clfrs = pandas.concat([clfrs, extra], ignore_index=True)
+        clfrs.to_csv(str(self.input.paths.classifiers), index=False)
+        # The inventory is copied as is #
+        inv = self.tile(self.input['inventory'], num_clfrs)
+        inv.to_csv(str(self.input.paths.inventory), index=False)
+        # The volumes come after the classifiers and the leading species #
+        curves = self.input['growth_curves']
+        factors = self.factors('growth_curves', len(curves))
+        curves = self.tile(curves, num_clfrs)
+        vols = curves.columns[num_clfrs + 2:]
+        curves[vols] = curves[vols].multiply(factors, axis=0)
+        curves.to_csv(str(self.input.paths.growth_curves), index=False)
+        # The events have their amount scaled #
+        events = self.input['events']
+        factors = self.factors('events', len(events))
+        events = self.tile(events, num_clfrs)
+        events['amount'] = events['amount'] * factors
+        # A proportion of the area cannot exceed one #
+        proportion = events['measurement_type'] == 'P'
+        events.loc[proportion, 'amount'] = \
+            events.loc[proportion, 'amount'].clip(upper=1.0)
+        events.to_csv(str(self.input.paths.events), index=False)
+        # The transitions have two classifier sets #
+        self.replicate_transitions(num_clfrs)
+
+    def replicate_transitions(self, num_clfrs):
+        """
+        The transitions file has a source and a destination classifier set,
+        with the same column names, so it is read and written by position.
+        """
+        # Load #
+        path = self.input.paths.transitions
+        try: df = pandas.read_csv(str(path))
+        except pandas.errors.EmptyDataError: return
+        if df.empty: return
+        # The original header, as pandas renames the duplicated names #
+        with open(str(path)) as handle: original = next(csv.reader(handle))
+        # Columns are: source classifiers, age criteria (5 columns),
+        # disturbance type, destination classifiers, regeneration delay,
+        # reset age and percent #
+        dest_end = 2 * num_clfrs + 6
+        percent  = df.columns[dest_end + 2]
+        # Insert the destination classifier first to keep positions valid #
+        df.insert(dest_end, self.classifier + '.1', None)
+        factors = self.factors('transitions', len(df))
+        df = self.tile(df, num_clfrs)
+        df[self.classifier + '.1'] = df[self.classifier]
+        # Scale the percentages #
+        df[percent] = numpy.minimum(df[percent] * factors, 100.0)
+        # Restore the duplicated header names, with the new classifier
+        # after the source and after the destination classifiers #
+        header = original[:num_clfrs] + [self.classifier] + \
+                 original[num_clfrs:dest_end] + [self.classifier] + \
+                 original[dest_end:]
+        df.to_csv(str(path), index=False, header=header)
+
+    def save(self):
+        """Sum the pools, fluxes and area of every member and save them."""
+        # Message #
+        self.runner.log.info("Summarizing ensemble results by member.")
+        # Record the multipliers #
+        self.members.to_csv(str(self.paths.members), index=False)
+        # Map classifier ids to member names #
+        ids = self.runner.simulation.sit.classifier_value_ids[self.classifier]
+        ids = {v: k for k, v in ids.items()}
+        cols  = ['identifier', 'timestep']
+        clfrs = self.runner.internal['classifiers'][cols + [self.classifier]]
+        clfrs['member'] = clfrs.pop(self.classifier).map(ids)
+        # Sum every table #
+        for name in ['area', 'flux', 'pools']:
+            df = self.runner.internal[name]
+            df = df.merge(clfrs, 'left', cols).drop(columns=['identifier'])
+            df = df.groupby(['member', 'timestep']).sum().reset_index()
+            df.to_csv(str(self.paths[name]),
+                      index        = False,
+                      float_format = '%g',
+                      compression  = 'gzip')
+
+    def load(self, name):
+        """Load one of the summarized tables, adding the year."""
+        df = pandas.read_csv(str(self.paths[name]))
+        if 'timestep' in df.columns:
+            df['year'] = self.runner.country.timestep_to_year(df['timestep'])
+        return df
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Written by Lucas Sinclair and Paul Rougieux.
+
+JRC Biomass Project.
+Unit D1 Bioeconomy.
+"""
+
+# Built-in modules #
+
+# Third party modules #
+import numpy, pandas
+
+# First party modules #
+
+# Internal modules #
+
+###############################################################################
+class EventEngine(object):
+    """
+    A replacement for the `pre_dynamics_func` of the `libcbm` rule based
+    processor. That function filters the full events table at every
+    timestep and evaluates every event of the step against every stand.
+
+    Here the events are grouped by timestep once, before the simulation
+    starts. Timesteps without any event skip the event processor entirely.
+    For the other timesteps, the classifier criteria of each event are
+    evaluated with boolean masks that are cached for every distinct set of
+    classifiers. Between two timesteps, these masks are only recomputed for
+    the stands whose classifiers changed or that were created by a split.
+    Events that cannot match any stand, given their classifiers and age
+    criteria, are not passed to `libcbm` at all.
+
+    Classifier values that are not plain values, such as wildcards or
+    aggregates, are treated as matching every stand, so that an event is
+    never discarded wrongly. The actual eligibility of the remaining events
+    is still decided by `libcbm`. The events discarded are still reported
+    in the statistics of the timestep, with nothing achieved and their
+    whole target as shortfall, like `libcbm` does for unmet events.
+
+    This relies on attributes of the `libcbm` rule based processor that
+    are not part of its public interface, see `required`. With a version of
+    `libcbm` that lacks them, the simulation uses the processor of `libcbm`.
+    """
+
+    # The attributes of the `libcbm` rule based processor used here #
+    required = ['_reset_parameters', 'event_processor', 'sit_events',
+                'sit_transitions', 'sit_disturbance_eligibilities',
+                'sit_event_stats_by_timestep', 'tr_func']
+
+    def __init__(self, parent):
+        # Default attributes #
+        self.parent = parent
+        self.sim    = parent
+        self.runner = parent.runner
+        # Shortcuts #
+        self.proc = self.sim.rule_based_proc
+        # The classifiers in the order of the `cbm_vars` columns #
+        self.names = list(self.sim.clfrs.columns)
+        # Precompile the events #
+        self.compile(self.proc.sit_events)
+        # Will be filled as the simulation runs #
+        self.masks   = {}
+        self.indices = {}
+        self.known   = None
+
+    def __repr__(self):
+        return '%s object code "%s"' % (self.__class__, self.runner.short_name)
+
+    @classmethod
+    def supported(cls, proc):
+        """Does this version of `libcbm` have what we need."""
+        return all(hasattr(proc, name) for name in cls.required)
+
+    #--------------------------- Special Methods -----------------------------#
+    def __call__(self, timestep, cbm_vars):
+        """This is called by the simulator before every timestep."""
+        # Same as in `libcbm`, forget the disturbances of the last step #
+        if self.proc._reset_parameters:
+            cbm_vars.parameters.disturbance_type.loc[:] = 0
+            cbm_vars.parameters.reset_age.loc[:] = -1
+        # The events of this timestep #
+        events, dropped = self.by_step.get(timestep), None
+        if events is not None:
+            keep    = self.eligible(timestep, events, cbm_vars)
+            dropped = events[~keep]
+            events  = events[keep]
+        # Apply them #
+        if events is not None and not events.empty:
+            cbm_vars, stats = self.proc.event_processor.process_events(
+                time_step         = timestep,
+                sit_events        = events,
+                cbm_vars          = cbm_vars,
+                sit_eligibilities = self.proc.sit_disturbance_eligibilities)
+        else:
+            stats = None
+        # The events dropped are reported as unmet #
+        if dropped is not None and not dropped.empty:
+            stats = pandas.concat([stats, self.unmet(dropped)],
+                                  ignore_index=True)
+        self.proc.sit_event_stats_by_timestep[timestep] = stats
+        # Transitions can only happen after disturbances #
+        if events is not None or self.undisturbed_transitions:
+            cbm_vars = self.proc.tr_func(cbm_vars)
+        # The classifiers must be contiguous integers for `libcbm` #
+        cbm_vars.classifiers = pandas.DataFrame(
+            columns = cbm_vars.classifiers.columns,
+            data    = numpy.ascontiguousarray(
+                cbm_vars.classifiers.to_numpy(dtype="int32")))
+        # Return #
+        return cbm_vars
+
+    #----------------------------- Properties --------------------------------#
+    @property
+    def undisturbed_transitions(self):
+        """
+        Are there transition rules that apply to stands that were not
+        disturbed during the timestep. Otherwise, a timestep without events
+        cannot trigger any transition.
+        """
+        if not self.proc._reset_parameters: return True
+        rules = self.proc.sit_transitions
+        if rules is None or rules.empty: return False
+        return bool((rules['disturbance_type_id'] <= 0).any())
+
+    #------------------------------- Methods ---------------------------------#
+    def compile(self, events):
+        """
+        Group the events by timestep and convert every distinct set of
+        classifiers to an array of classifier ids, with -1 meaning that
+        any value matches.
+        """
+        # Group by timestep #
+        self.by_step = dict(list(events.groupby('time_step', sort=False)))
+        # The classifier ids #
+        value_ids = self.sim.sit.classifier_value_ids
+        # Every distinct classifier set #
+        self.sets = {}
+        for key in events[self.names].drop_duplicates().itertuples(False):
+            key = tuple(key)
+            ids = [value_ids[name].get(value, -1)
+                   for name, value in zip(self.names, key)]
+            self.sets[key] = numpy.array(ids)
+        # Message #
+        msg = "Compiled %i events over %i timesteps and %i classifier sets."
+        self.runner.log.info(msg % (len(events), len(self.by_step),
+                                    len(self.sets)))
+
+    def update(self, classifiers):
+        """
+        Bring the cached masks up to date with the classifiers of the
+        stands, only evaluating the rows that are new or that changed since
+        the last time.
+        """
+        # Current values #
+        current = classifiers[self.names].to_numpy()
+        # Which rows need to be evaluated #
+        if self.known is None:
+            rows = numpy.arange(len(current))
+        else:
+            before  = len(self.known)
+            changed = (current[:before] != self.known).any(axis=1)
+            rows    = numpy.concatenate([numpy.flatnonzero(changed),
+                                         numpy.arange(before, len(current))])
+        # Nothing changed #
+        if self.known is not None and len(rows) == 0: return
+        # Update every mask #
+        for key, ids in self.sets.items():
+            mask = self.masks.get(key)
+            if mask is None or len(mask) < len(current):
+                grown = numpy.zeros(len(current), dtype=bool)
+                if mask is not None: grown[:len(mask)] = mask
+                mask = grown
+            mask[rows] = self.match(current[rows], ids)
+            self.masks[key]   = mask
+            self.indices[key] = numpy.flatnonzero(mask)
+        # Remember #
+        self.known = current
+
+    @staticmethod
+    def match(values, ids):
+        """Which rows have the classifier ids given, -1 matches all."""
+        result = numpy.ones(len(values), dtype=bool)
+        for j in numpy.flatnonzero(ids >= 0):
+            result &= values[:, j] == ids[j]
+        return result
+
+    def eligible(self, timestep, events, cbm_vars):
+        """
+        Return a boolean array telling which events of this timestep have
+        at least one stand with the right classifiers and the right age.
+        """
+        # Refresh the masks #
+        self.update(cbm_vars.classifiers)
+        # The age of every stand #
+        age = cbm_vars.state['age'].to_numpy()
+        # Check every event against the stands it could target #
+        keys = events[self.names].itertuples(False)
+        keep = numpy.zeros(len(events), dtype=bool)
+        mins = events['min_age'].to_numpy()
+        maxs = events['max_age'].to_numpy()
+        for i, key in enumerate(keys):
+            ages = age[self.indices[tuple(key)]]
+            if mins[i] >= 0: ages = ages[ages >= mins[i]]
+            if maxs[i] >= 0: ages = ages[ages <= maxs[i]]
+            keep[i] = len(ages) > 0
+        # Message #
+        if not keep.all():
+            msg = "Time step %i: %i events have no eligible stand."
+            self.runner.log.info(msg % (timestep, (~keep).sum()))
+        # Return #
+        return keep
+
+    @staticmethod
+    def unmet(events):
+        """
+        The statistics of events that could not disturb anything, in the
+        same columns as the ones returned by `libcbm`.
+        """
+        target = events['target'] if 'target' in events else numpy.nan
+        return pandas.DataFrame({'sit_event_index':       events.index,
+                                 'total_eligible_value':  0.0,
+                                 'total_achieved':        0.0,
+                                 'shortfall':             target,
+                                 'num_records_disturbed': 0,
+                                 'num_splits':            0,
+                                 'num_events_compared':   0})
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Written by Lucas Sinclair and Paul Rougieux.
+
+JRC Biomass Project.
+Unit D1 Bioeconomy.
+"""
+
+# Built-in modules #
+
+# Third party modules #
+import numpy, pandas
+
+# First party modules #
+from autopaths.auto_paths import AutoPaths
+
+# Internal modules #
+
+###############################################################################
+class HarvestAllocator(object):
+    """
+    Converts the wood demand of the GFTMX economic model into harvest
+    disturbances while the simulation runs, instead of using precomputed
+    amounts in `events.csv`.
+
+    At every timestep, after the events of that timestep, the roundwood and
+    fuelwood demand of the country for that year is converted to tonnes of
+    carbon. Stands are then clear-cut in order of priority until the
+    merchantable carbon they contain covers the demand. The priority is the
+    oldest stands first, and for stands of the same age the ones with the
+    most carbon per hectare. Stands already disturbed by an event during
+    the same timestep and stands younger than `min_age` are not eligible.
+
+    The allocation is done on whole arrays of the `cbm_vars` with a sort
+    and a cumulative sum, so its cost does not depend on the number of
+    events. Stands are not split, so the last stand selected can slightly
+    exceed the demand.
+
+    Enabled by setting the `demand_harvest` attribute of a combo to the
+    id of the clear-cut disturbance type in `disturbance_types.csv`. The
+    events of that type in the years that have a demand are then removed
+    from the input by the `PreProcessor`, so that the harvest is not
+    counted twice. What
+    was asked and what was cut at every timestep is saved to the file
+    `output/harvest/harvest.csv` of the runner.
+    """
+
+    all_paths = """
+    /output/harvest/harvest.csv
+    """
+
+    # Tonnes of dry matter per cubic meter of wood #
+    wood_density = 0.5
+
+    # Tonnes of carbon per tonne of dry matter #
+    carbon_fraction = 0.5
+
+    # Fraction of the merchantable carbon that ends up as products #
+    efficiency = 0.85
+
+    # Stands younger than this are never cut #
+    min_age = 30
+
+    # The merchantable pools of the `cbm_vars` #
+    pools = ['SoftwoodMerchantable', 'HardwoodMerchantable']
+
+    def __init__(self, parent):
+        # Default attributes #
+        self.parent  = parent
+        self.sim     = parent
+        self.runner  = parent.runner
+        self.country = parent.country
+        # Directories #
+        self.paths = AutoPaths(self.runner.data_dir, self.all_paths)
+        # One row per timestep #
+        self.rows = []
+
+    def __repr__(self):
+        return '%s object code "%s"' % (self.__class__, self.runner.short_name)
+
+    def __bool__(self): return bool(self.runner.combo.demand_harvest)
+
+    #----------------------------- Properties --------------------------------#
+    @property
+    def demand(self):
+        """
+        The demand of this country in cubic meters, indexed by year, summing
+        the roundwood and the fuelwood.
+        """
+        # Reading the files is only done when the demand is needed #
+        from libcbm_runner.info.demand import roundwood, fuelwood
+        df = pandas.concat([roundwood, fuelwood])
+        df = df.query("country == '%s'" % self.country.country_name)
+        # Volumes can be given in thousands #
+        factor = numpy.where(df['unit'].str.startswith('1000'), 1000.0, 1.0)
+        df = df.assign(value = df['value'] * factor)
+        # Return #
+        return df.groupby('year')['value'].sum()
+
+    @property
+    def disturbance_type_id(self):
+        """The `libcbm` identifier of the clear-cut disturbance type."""
+        # Find the name from the identifier of the input files #
+        dist = self.country.orig_data['disturbance_types']
+        dist = dist.set_index(dist.iloc[:, 0].astype(str)).iloc[:, 1]
+        name = dist[str(self.runner.combo.demand_harvest)]
+        # Convert the name #
+        mapping = self.sim.sit.sit_mapping
+        ids = mapping.get_default_disturbance_type_id(pandas.Series([name]))
+        return int(ids[0])
+
+    #------------------------------- Methods ---------------------------------#
+    def prepare(self):
+        """Done once before the simulation starts."""
+        self.demand_by_year = self.demand
+        self.dist_id        = self.disturbance_type_id
+        self.rows           = []
+
+    def __call__(self, timestep, cbm_vars):
+        """Allocate the demand of one timestep to the stands."""
+        # The demand converted to carbon #
+        year   = self.country.timestep_to_year(timestep)
+        volume = float(self.demand_by_year.get(year, 0.0))
+        target = volume * self.wood_density * self.carbon_fraction
+        # What each stand could provide #
+        area  = cbm_vars.inventory['area'].to_numpy()
+        age   = cbm_vars.state['age'].to_numpy()
+        dist  = cbm_vars.parameters['disturbance_type'].to_numpy()
+        stock = cbm_vars.pools[self.pools].to_numpy().sum(axis=1)
+        stock = stock * area * self.efficiency
+        # Which stands can be cut #
+        eligible = (dist <= 0) & (age >= self.min_age) & (stock > 0)
+        index = numpy.flatnonzero(eligible)
+        # Oldest first, then the most carbon per hectare #
+        density = stock[index] / area[index]
+        order = index[numpy.lexsort((-density, -age[index]))]
+        # Take stands until the demand is covered #
+        if target <= 0: chosen = order[:0]
+        else:
+            total  = numpy.cumsum(stock[order])
+            count  = numpy.searchsorted(total, target) + 1
+            chosen = order[:count]
+        # Apply the disturbance #
+        if len(chosen):
+            column = cbm_vars.parameters.columns.get_loc('disturbance_type')
+            cbm_vars.parameters.iloc[chosen, column] = self.dist_id
+        # Record #
+        harvested = float(stock[chosen].sum())
+        self.rows.append({'timestep':     timestep,
+                          'year':         year,
+                          'demand_m3':    volume,
+                          'demand_c':     target,
+                          'harvested_c':  harvested,
+                          'stands':       len(chosen),
+                          'area':         float(area[chosen].sum()),
+                          'unmet_c':      max(target - harvested, 0.0)})
+        # Warn when there is not enough wood #
+        if harvested < target:
+            msg = "Harvest demand of %.0f tC not met in %i, only %.0f tC."
+            self.runner.log.warning(msg % (target, year, harvested))
+        # Return #
+        return cbm_vars
+
+    def save(self):
+        """Write what was asked and cut at every timestep."""
+        df = pandas.DataFrame(self.rows)
+        df.to_csv(str(self.paths.harvest), index=False)
+
+    def load(self):
+        """Read the table written by `save`."""
+        return pandas.read_csv(str(self.paths.harvest))
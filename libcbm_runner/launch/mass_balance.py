@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Written by Lucas Sinclair and Paul Rougieux.
+
+JRC Biomass Project.
+Unit D1 Bioeconomy.
+"""
+
+# Built-in modules #
+
+# Third party modules #
+import numpy, pandas
+
+# First party modules #
+from autopaths.auto_paths import AutoPaths
+
+# Internal modules #
+
+###############################################################################
+class MassBalanceError(Exception):
+    """Raised when carbon is created or lost during a simulation."""
+
+###############################################################################
+class MassBalance(object):
+    """
+    Checks at every timestep, while the simulation runs, that no carbon is
+    created or lost. The pools of `libcbm` include the atmosphere and the
+    harvested products, so the sum of all pools except `Input` can only
+    change by what enters through growth:
+
+        sum(pools[t]) - sum(pools[t-1]) == sum(growth fluxes[t])
+
+    This is checked for the whole country, and for every stand that kept
+    the same area during the timestep, i.e. was not split by a disturbance.
+    It only uses sums over the arrays of the `cbm_vars` already in memory.
+
+    The first timestep where the balance is broken is reported in the log
+    of the runner, with the stands involved summed by the classifiers of
+    `combo.group_by`. The residual of every timestep is saved to the file
+    `logs/mass_balance.csv` of the runner.
+
+    Enabled by setting `mass_balance` of the combo to 'warn', or to 'stop'
+    to raise a `MassBalanceError` and end the simulation at once.
+    """
+
+    all_paths = """
+    /logs/mass_balance.csv
+    """
+
+    # The fluxes that bring carbon from the `Input` pool into the system #
+    input_fluxes = ['DeltaBiomass_AG', 'DeltaBiomass_BG']
+
+    # Relative tolerance, with respect to the total carbon #
+    tolerance = 1e-6
+
+    def __init__(self, parent):
+        # Default attributes #
+        self.parent = parent
+        self.sim    = parent
+        self.runner = parent.runner
+        # Directories #
+        self.paths = AutoPaths(self.runner.data_dir, self.all_paths)
+        # The previous timestep #
+        self.totals = None
+        self.area   = None
+        # One row per timestep #
+        self.rows   = []
+        # The first timestep with a problem #
+        self.first  = None
+
+    def __repr__(self):
+        return '%s object code "%s"' % (self.__class__, self.runner.short_name)
+
+    def __bool__(self): return bool(self.runner.combo.mass_balance)
+
+    #------------------------------- Methods ---------------------------------#
+    def wrap(self, reporting_func):
+        """Return a reporting function that also checks the balance."""
+        def reporting(timestep, cbm_vars):
+            reporting_func(timestep, cbm_vars)
+            self.check(timestep, cbm_vars)
+        return reporting
+
+    def check(self, timestep, cbm_vars):
+        """Compare the change of carbon to the inputs for one timestep."""
+        # Carbon per hectare in the system and entering it #
+        pools  = cbm_vars.pools.drop(columns='Input', errors='ignore')
+        totals = pools.to_numpy().sum(axis=1)
+        # A copy, libcbm shrinks the area of split stands in place #
+        area   = cbm_vars.inventory['area'].to_numpy(copy=True)
+        # Nothing to compare to on the first call #
+        if self.totals is None:
+            self.totals, self.area = totals, area
+            return
+        growth = cbm_vars.flux[self.input_fluxes].to_numpy().sum(axis=1)
+        # The whole country #
+        before   = float(numpy.dot(self.totals, self.area))
+        after    = float(numpy.dot(totals, area))
+        inputs   = float(numpy.dot(growth, area))
+        residual = after - before - inputs
+        limit    = self.tolerance * max(abs(after), 1.0)
+        # Every stand that was not split #
+        n      = len(self.totals)
+        same   = numpy.isclose(area[:n], self.area)
+        per_ha = totals[:n] - self.totals - growth[:n]
+        bad    = same & (numpy.abs(per_ha) >
+                         self.tolerance * numpy.maximum(totals[:n], 1.0))
+        stands = numpy.flatnonzero(bad)
+        # Record #
+        self.rows.append({'timestep':   timestep,
+                          'before':     before,
+                          'after':      after,
+                          'inputs':     inputs,
+                          'residual':   residual,
+                          'bad_stands': len(stands)})
+        # Remember for the next timestep #
+        self.totals, self.area = totals, area
+        # Report #
+        if abs(residual) > limit or len(stands):
+            self.report(timestep, residual, stands,
+                        per_ha[stands] * area[stands], cbm_vars)
+
+    def report(self, timestep, residual, stands, residuals, cbm_vars):
+        """Log the first problem and optionally stop the simulation."""
+        # Only the first timestep is detailed #
+        if self.first is None:
+            self.first = timestep
+            msg = "Mass balance broken at timestep %i: %.6g tC for the " \
+                  "whole country, %i stands off."
+            self.runner.log.error(msg % (timestep, residual, len(stands)))
+            if len(stands):
+                groups = self.by_group(stands, residuals, cbm_vars)
+                self.runner.log.error("Residuals by group:\n%s" % groups)
+                msg = "First stands: %s"
+                self.runner.log.error(msg % list(stands[:10]))
+        # Stop #
+        if self.runner.combo.mass_balance == 'stop':
+            msg = "Mass balance broken at timestep %i (%.6g tC)."
+            raise MassBalanceError(msg % (timestep, residual))
+
+    def by_group(self, stands, residuals, cbm_vars):
+        """Sum the residuals of the stands by the classifiers of the combo."""
+        # The classifier values of the stands #
+        group = [c for c in self.runner.combo.group_by
+                 if c in cbm_vars.classifiers.columns]
+        df = cbm_vars.classifiers.iloc[stands][group].copy()
+        # Convert the ids to values #
+        for name in group:
+            ids = self.sim.sit.classifier_value_ids[name]
+            df[name] = df[name].map({v: k for k, v in ids.items()})
+        df['residual'] = residuals
+        if not group: return str(df['residual'].sum())
+        # Return #
+        return df.groupby(group)['residual'].sum().to_string()
+
+    def save(self):
+        """Write the residual of every timestep to disk."""
+        if not self.rows: return
+        df = pandas.DataFrame(self.rows)
+        df.to_csv(str(self.paths.mass_balance), index=False)
+
+    def load(self):
+        """Load the residuals of the last run from disk."""
+        return pandas.read_csv(str(self.paths.mass_balance))
@@ -17,6 +17,11 @@ from libcbm.model.cbm import cbm_simulator
 # First party modules #
 
 # Internal modules #
+from libcbm_runner.launch.accumulator  import ArrayAccumulator
+from libcbm_runner.launch.aggregator   import GroupAggregator
+from libcbm_runner.launch.event_engine import EventEngine
+from libcbm_runner.launch.harvest      import HarvestAllocator
+from libcbm_runner.launch.mass_balance import MassBalance
 
 ###############################################################################
 class Simulation(object):
@@ -46,6 +51,8 @@ class Simulation(object):
         change the growth curves, and this can be done by switching the
         classifier value of each inventory record.
         """
+        # Start timing the rules #
+        self.runner.telemetry.before_rules(timestep)
         # Check the timestep #
         if timestep == 1:
             # Print message #
@@ -62,8 +69,16 @@ class Simulation(object):
             cbm_vars.classifiers[key] = id_of_cur
         # Print a message #
         self.parent.log.info(f"Time step {timestep} is about to run.")
+        # Tag the samples of the profiler if there is one #
+        if self.runner.profiling: self.runner.profiling.timestep = timestep
+        # Apply the events and transitions #
+        cbm_vars = self.event_engine(timestep, cbm_vars)
+        # Cut what the economic model demands #
+        if self.harvest: cbm_vars = self.harvest(timestep, cbm_vars)
+        # Record what happened #
+        self.runner.telemetry.after_rules(timestep, cbm_vars)
         # Return #
-        return self.rule_based_proc.pre_dynamics_func(timestep, cbm_vars)
+        return cbm_vars
 
     #------------------------------- Methods ---------------------------------#
     # noinspection PyBroadException
@@ -82,6 +97,10 @@ class Simulation(object):
             self.runner.log.exception("Exception", exc_info=True)
             self.error = True
             if interrupt_on_error: raise
+        # Record the time series of every timestep, even if we failed #
+        finally:
+            self.runner.telemetry.save()
+            if getattr(self, 'mass_balance', None): self.mass_balance.save()
 
     def run(self):
         """
@@ -104,15 +123,32 @@ class Simulation(object):
         init_inv = sit_cbm_factory.initialize_inventory
         self.clfrs, self.inv = init_inv(self.sit)
         # This will contain results #
-        create_func = cbm_simulator.create_in_memory_reporting_func
-        self.results, self.reporting_func = create_func()
+        self.results, self.reporting_func = self.create_reporting()
         # Create a CBM object #
         with sit_cbm_factory.initialize_cbm(self.sit) as self.cbm:
             # Create a function to apply rule based events #
             create_proc = sit_cbm_factory.create_sit_rule_based_processor
             self.rule_based_proc = create_proc(self.sit, self.cbm)
+            # Events are grouped by timestep before starting #
+            if EventEngine.supported(self.rule_based_proc):
+                self.event_engine = EventEngine(self)
+            else:
+                msg = "This version of libcbm lacks what the EventEngine " \
+                      "needs, using its own rule based processor instead."
+                self.runner.log.warning(msg)
+                self.event_engine = self.rule_based_proc.pre_dynamics_func
+            # Harvest driven by the demand, if the combo asks for it #
+            self.harvest = HarvestAllocator(self)
+            if self.harvest: self.harvest.prepare()
             # Message #
             self.runner.log.info("Calling the cbm_simulator.")
+            # Record how long every timestep takes #
+            self.runner.telemetry.start()
+            reporting_func = self.runner.telemetry.wrap(self.reporting_func)
+            # Optionally check that no carbon is created or lost #
+            self.mass_balance = MassBalance(self)
+            if self.mass_balance:
+                reporting_func = self.mass_balance.wrap(reporting_func)
             # Run #
             cbm_simulator.simulate(
                 self.cbm,
@@ -120,19 +156,47 @@ class Simulation(object):
                 classifiers       = self.clfrs,
                 inventory         = self.inv,
                 pre_dynamics_func = self.dynamics_func,
-                reporting_func    = self.reporting_func
+                reporting_func    = reporting_func
             )
+        # Record the harvest #
+        if self.harvest: self.harvest.save()
+        # Report the memory used by preallocated arrays #
+        if isinstance(self.results, ArrayAccumulator):
+            msg = "Results stored in arrays of %.1f MiB."
+            self.runner.log.info(msg % (self.results.nbytes / 2**20))
         # If we got here then we did not encounter any simulation error #
         self.error = False
         # Return for convenience #
         return self.results
 
+    def create_reporting(self):
+        """
+        Return a pair of objects: one that will contain the results and the
+        reporting function that fills it at every timestep. The combo picks
+        which kind of storage is used with its `reporting` attribute.
+        """
+        # Preallocated arrays #
+        if self.runner.combo.reporting == 'arrays':
+            results = ArrayAccumulator(self.runner.num_timesteps)
+            return results, results
+        # Only sums by groups of classifiers #
+        if self.runner.combo.reporting == 'aggregate':
+            results = GroupAggregator(self.sit.classifier_value_ids,
+                                      self.runner.combo.group_by)
+            return results, results
+        # The default data frames of libcbm #
+        create_func = cbm_simulator.create_in_memory_reporting_func
+        return create_func()
+
     def clear(self):
         """
         Remove all objects from RAM otherwise the kernel will kill the python
         process after a couple countries being run.
         """
         if hasattr(self, 'cbm'):            del self.cbm
+        if hasattr(self, 'event_engine'):   del self.event_engine
+        if hasattr(self, 'harvest'):        del self.harvest
+        if hasattr(self, 'mass_balance'):   del self.mass_balance
         if hasattr(self, 'sit'):            del self.sit
         if hasattr(self, 'clfrs'):          del self.clfrs
         if hasattr(self, 'inv'):            del self.inv
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Written by Lucas Sinclair and Paul Rougieux.
+
+JRC Biomass Project.
+Unit D1 Bioeconomy.
+"""
+
+# Built-in modules #
+import os, time
+
+# Third party modules #
+import pandas
+
+# First party modules #
+from autopaths.auto_paths import AutoPaths
+
+# Internal modules #
+
+###############################################################################
+class Telemetry(object):
+    """
+    This class records a small time series describing every timestep of a
+    simulation as it runs:
+
+        * `rules_time`:     seconds spent applying the disturbance events
+                            and transition rules.
+        * `dynamics_time`:  seconds spent in the `libcbm` step itself. For
+                            timestep 0 this is the spin-up.
+        * `reporting_time`: seconds spent storing the results.
+        * `num_stands`:     number of stands, which grows when disturbances
+                            split stands.
+        * `num_disturbed`:  number of stands disturbed.
+        * `disturbed_area`: area of the stands disturbed.
+        * `rss_mib`:        memory used by the process after the timestep.
+        * `mode`:           'alone' if no other runner used the process at
+                            the same time, otherwise 'background' or
+                            'pipeline', in which case `rss_mib` also
+                            includes the memory of the other runners.
+
+    The table is saved in the logs directory of the runner:
+
+        >>> print(runner.telemetry.load())
+    """
+
+    all_paths = """
+    /logs/telemetry.csv
+    """
+
+    # The order of the columns in the table #
+    columns = ['timestep', 'rules_time', 'dynamics_time', 'reporting_time',
+               'num_stands', 'num_disturbed', 'disturbed_area', 'rss_mib',
+               'mode']
+
+    def __init__(self, parent):
+        # Default attributes #
+        self.parent = parent
+        self.runner = parent
+        # Directories #
+        self.paths = AutoPaths(self.parent.data_dir, self.all_paths)
+        # Will be filled as the simulation runs #
+        self.rows = {}
+        self.last = None
+
+    def __repr__(self):
+        return '%s object code "%s"' % (self.__class__, self.runner.short_name)
+
+    def __bool__(self): return self.paths.telemetry.exists
+
+    #----------------------------- Properties --------------------------------#
+    @property
+    def rss(self):
+        """The resident memory of the current process in MiB."""
+        # On linux, the second number is the resident size in pages #
+        try:
+            with open('/proc/self/statm') as handle:
+                pages = int(handle.read().split()[1])
+            return pages * os.sysconf('SC_PAGE_SIZE') / 2**20
+        # Otherwise use the peak memory #
+        except (OSError, ValueError, AttributeError):
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+    #------------------------------- Methods ---------------------------------#
+    def elapsed(self):
+        """Seconds since the last call."""
+        now = time.perf_counter()
+        result, self.last = now - self.last, now
+        return result
+
+    def row(self, timestep):
+        """The record of a given timestep."""
+        return self.rows.setdefault(timestep, {'timestep': timestep})
+
+    def start(self):
+        """Called just before the simulator starts."""
+        self.rows = {}
+        self.last = time.perf_counter()
+        self.mode = self.runner.run_mode
+
+    def before_rules(self, timestep):
+        """Called when the simulator asks for the events of a timestep."""
+        self.last = time.perf_counter()
+
+    def after_rules(self, timestep, cbm_vars):
+        """Called once the events and transitions of a timestep are done."""
+        row = self.row(timestep)
+        row['rules_time'] = self.elapsed()
+        disturbed = cbm_vars.parameters['disturbance_type'].to_numpy() > 0
+        area      = cbm_vars.inventory['area'].to_numpy()
+        row['num_disturbed']  = int(disturbed.sum())
+        row['disturbed_area'] = float(area[disturbed].sum())
+
+    def wrap(self, reporting_func):
+        """
+        Return a reporting function that calls the one given and records
+        the time spent in the dynamics before it and in the reporting.
+        """
+        def reporting(timestep, cbm_vars):
+            row = self.row(timestep)
+            row['dynamics_time'] = self.elapsed()
+            reporting_func(timestep, cbm_vars)
+            row['reporting_time'] = self.elapsed()
+            row['num_stands']     = len(cbm_vars.inventory.index)
+            row['rss_mib']        = self.rss
+            row['mode']           = self.mode
+        return reporting
+
+    def save(self):
+        """Write the records to disk."""
+        if not self.rows: return
+        df = pandas.DataFrame([self.rows[t] for t in sorted(self.rows)],
+                              columns=self.columns)
+        df.to_csv(str(self.paths.telemetry), index=False, float_format='%g')
+        return self.paths.telemetry
+
+    def load(self):
+        """Load the records of the last run from disk."""
+        return pandas.read_csv(str(self.paths.telemetry))
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Written by Lucas Sinclair and Paul Rougieux.
+
+JRC Biomass Project.
+Unit D1 Bioeconomy.
+"""
+
+# Built-in modules #
+
+# Third party modules #
+import pandas
+
+# First party modules #
+from autopaths.auto_paths import AutoPaths
+
+# Internal modules #
+
+###############################################################################
+class AggregateData(object):
+    """
+    This class will provide access to the aggregated output data of a Runner
+    as several pandas data frames. These tables only exist when the combo
+    uses `reporting = 'aggregate'`, in which case the pools, fluxes and area
+    are summed by the classifiers listed in the combo's `group_by`
+    attribute at every timestep, and no per-stand table is kept.
+
+        >>> print(runner.aggregate.load('pools'))
+        >>> print(runner.aggregate.load('flux'))
+    """
+
+    all_paths = """
+    /output/agg/
+    /output/agg/area.csv.gz
+    /output/agg/flux.csv.gz
+    /output/agg/pools.csv.gz
+    """
+
+    def __init__(self, parent):
+        # Default attributes #
+        self.parent = parent
+        self.runner = parent
+        # Directories #
+        self.paths = AutoPaths(self.parent.data_dir, self.all_paths)
+
+    def __repr__(self):
+        return '%s object code "%s"' % (self.__class__, self.runner.short_name)
+
+    def __bool__(self): return self.paths.pools.exists
+
+    #--------------------------- Special Methods -----------------------------#
+    def __getitem__(self, item):
+        """Read the CSV file with the passed name."""
+        return pandas.read_csv(str(self.paths[item]), compression='gzip')
+
+    def __setitem__(self, item, df):
+        """Record a dataframe to disk using the file with the passed name."""
+        return df.to_csv(str(self.paths[item]),
+                         index        = False,
+                         float_format = '%g',
+                         compression  = 'gzip')
+
+    #------------------------------- Methods ---------------------------------#
+    def save(self):
+        """Save the aggregated tables that were built during the simulation."""
+        # Message #
+        msg = "Saving results aggregated by %s to disk."
+        self.parent.log.info(msg % self.runner.combo.group_by)
+        # The aggregator has the same attribute names as `sim.results` #
+        self['area']  = self.runner.internal['area']
+        self['flux']  = self.runner.internal['flux']
+        self['pools'] = self.runner.internal['pools']
+
+    def load(self, name):
+        """Loads one of the aggregated tables and adds the year to it."""
+        # Load from CSV #
+        df = self[name]
+        # Add year #
+        df['year'] = self.runner.country.timestep_to_year(df['timestep'])
+        # Return #
+        return df
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Written by Lucas Sinclair and Paul Rougieux.
+
+JRC Biomass Project.
+Unit D1 Bioeconomy.
+"""
+
+# Built-in modules #
+
+# Third party modules #
+import numpy, pandas
+
+# First party modules #
+from autopaths.auto_paths import AutoPaths
+
+# Internal modules #
+
+###############################################################################
+class HarvestedWoodProducts(object):
+    """
+    This class computes the carbon stored in harvested wood products (HWP)
+    from the harvested carbon of every classifier group and year.
+
+    The harvested carbon is allocated to product pools according to the
+    file `extras/product_types.csv` of the country, where the rows of the
+    scenario chosen in the combo's `silv['product_type']` are used. That
+    file must have the following columns:
+
+        * `product`:   the name of the product, such as 'sawnwood'.
+        * `fraction`:  the share of the harvested carbon it receives.
+        * `half_life`: optional, the half-life of the product in years.
+
+    It can also contain any of the `group_by` classifiers of the combo to
+    give different fractions to different groups. When the half-life is
+    missing, the IPCC default of the product is used.
+
+    Every pool follows the IPCC first-order decay equation, starting empty
+    at the first year of the simulation:
+
+        C(t) = exp(-k) * C(t-1) + (1 - exp(-k)) / k * inflow(t)
+
+    This recurrence is computed for all groups, products and years at once
+    as a product with a lower-triangular matrix of decay factors, instead
+    of a loop over the years.
+
+        >>> print(runner.hwp.load())
+    """
+
+    all_paths = """
+    /output/hwp/
+    /output/hwp/hwp.csv.gz
+    """
+
+    # Default half-lives in years (IPCC 2019 refinement, table 12.3) #
+    default_half_lives = {'sawnwood': 35.0,
+                          'panels':   25.0,
+                          'paper':    2.0}
+
+    def __init__(self, parent):
+        # Default attributes #
+        self.parent = parent
+        self.runner = parent
+        # Directories #
+        self.paths = AutoPaths(self.parent.data_dir, self.all_paths)
+
+    def __repr__(self):
+        return '%s object code "%s"' % (self.__class__, self.runner.short_name)
+
+    def __call__(self, indicators):
+        """
+        Compute the HWP pools from the `harvested_c` column of the
+        indicators produced by the post-processor and save them to disk.
+        """
+        # Load the product definitions #
+        products = self.product_types
+        if products is None: return None
+        # Message #
+        self.parent.log.info("Computing harvested wood products.")
+        # Compute #
+        df = self.pools(indicators, products)
+        # Write to disk #
+        df.to_csv(str(self.paths.hwp),
+                  index        = False,
+                  float_format = '%g',
+                  compression  = 'gzip')
+        # Return #
+        return df
+
+    #----------------------------- Properties --------------------------------#
+    @property
+    def product_types(self):
+        """
+        The product definitions for the scenario of the combo, or None if
+        the country does not define any.
+        """
+        # Load #
+        try: df = self.runner.country.orig_data['product_types']
+        except (FileNotFoundError, pandas.errors.EmptyDataError): df = None
+        # Check the columns #
+        if df is None or not {'product', 'fraction'} <= set(df.columns):
+            msg = "No product types defined, skipping harvested wood products."
+            self.parent.log.info(msg)
+            return None
+        # Filter the scenario #
+        scenario = getattr(self.runner.combo, 'silv', {}).get('product_type')
+        if 'scenario' in df.columns and scenario is not None:
+            df = df.query("scenario == '%s'" % scenario)
+            df = df.drop(columns=['scenario'])
+        # Fill the missing half-lives #
+        defaults = df['product'].map(self.default_half_lives)
+        if 'half_life' not in df.columns: df['half_life'] = defaults
+        else: df['half_life'] = df['half_life'].fillna(defaults)
+        # Check #
+        if df['half_life'].isna().any():
+            missing = df.loc[df['half_life'].isna(), 'product'].unique()
+            path = self.runner.country.orig_data.paths.product_types
+            msg  = "No half-life for the products %s in '%s'."
+            raise ValueError(msg % (list(missing), path))
+        # Return #
+        return df
+
+    #------------------------------- Methods ---------------------------------#
+    @staticmethod
+    def decay_matrix(half_lives, num_years):
+        """
+        Return an array of shape (products, years, years) where the element
+        [p, t, s] is the share of the inflow of year s to product p that
+        is still present at the end of year t, following the IPCC
+        first-order decay.
+        """
+        k      = numpy.log(2) / numpy.asarray(half_lives, dtype=float)
+        years  = numpy.arange(num_years)
+        lag    = years[:, None] - years[None, :]
+        decay  = numpy.exp(-k[:, None, None] * numpy.maximum(lag, 0))
+        decay *= (lag >= 0)
+        # The inflow of a given year only decays during part of that year #
+        factor = (1 - numpy.exp(-k)) / k
+        return decay * factor[:, None, None]
+
+    def pools(self, indicators, products):
+        """
+        Allocate the harvested carbon to products and compute the stock
+        and emissions of every product pool for every group and year.
+        """
+        # The groups and years #
+        group = list(self.runner.combo.group_by)
+        years = numpy.sort(indicators['year'].unique())
+        # Inflow of harvested carbon as a groups x years array #
+        inflow = indicators.pivot_table(index   = group,
+                                        columns = 'year',
+                                        values  = 'harvested_c',
+                                        aggfunc = 'sum',
+                                        fill_value = 0.0)
+        inflow = inflow.reindex(columns=years, fill_value=0.0)
+        # The fraction of every product for every group #
+        names = list(products['product'].unique())
+        keys  = [col for col in group if col in products.columns]
+        index = inflow.index.to_frame(index=False)
+        if keys: shares = index.merge(products, 'left', keys)
+        else:    shares = index.merge(products, 'cross')
+        shares = shares.pivot_table(index      = group,
+                                    columns    = 'product',
+                                    values     = 'fraction',
+                                    aggfunc    = 'sum',
+                                    fill_value = 0.0)
+        shares = shares.reindex(index=inflow.index, columns=names,
+                                fill_value=0.0)
+        # One half-life per product #
+        half_lives = products.groupby('product')['half_life'].first()
+        decay = self.decay_matrix(half_lives[names].values, len(years))
+        # Inflow and stock with shape groups x products x years #
+        flows  = numpy.einsum('gp,gt->gpt', shares.values, inflow.values)
+        stocks = numpy.einsum('pts,gps->gpt', decay, flows)
+        # Emissions are the inflow minus the change in stock #
+        change = numpy.diff(stocks, axis=2, prepend=0.0)
+        losses = flows - change
+        # Build the data frame #
+        shape = stocks.shape
+        df = pandas.DataFrame({
+            'product':   numpy.tile(numpy.repeat(names, shape[2]), shape[0]),
+            'year':      numpy.tile(years, shape[0] * shape[1]),
+            'inflow':    flows.ravel(),
+            'stock':     stocks.ravel(),
+            'emissions': losses.ravel()})
+        for i, clfr in enumerate(group):
+            values = inflow.index.get_level_values(i)
+            df.insert(i, clfr, numpy.repeat(values, shape[1] * shape[2]))
+        # Return #
+        return df
+
+    def load(self):
+        """Load the harvested wood products that were previously computed."""
+        return pandas.read_csv(str(self.paths.hwp), compression='gzip')
@@ -16,6 +16,8 @@ Unit D1 Bioeconomy.
 from plumbing.common import camel_to_snake
 
 # Internal modules #
+from libcbm_runner.launch.accumulator import ArrayAccumulator
+from libcbm_runner.launch.aggregator  import GroupAggregator
 
 ###############################################################################
 class InternalData(object):
@@ -37,11 +39,14 @@ class InternalData(object):
     def __getitem__(self, item):
         """Read a dataframe from the `results` attribute."""
         # Load #
-        df = getattr(self.sim.results, item).copy()
+        df = getattr(self.sim.results, item)
+        # Tables from arrays or aggregates are new and can be modified #
+        fresh = (ArrayAccumulator, GroupAggregator)
+        if not isinstance(self.sim.results, fresh): df = df.copy()
         # Modify column names #
         df.columns = df.columns.to_series().apply(camel_to_snake)
         # Rename column names #
-        df = df.rename(columns = {'input': 'area'})
+        df = df.rename(columns = {'input': 'area'}, copy=False)
         # Return #
         return df
 
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Written by Lucas Sinclair and Paul Rougieux.
+
+JRC Biomass Project.
+Unit D1 Bioeconomy.
+
+A small framework for the scripts that convert the input files of every
+country in the `libcbm_data` repository. Usage:
+
+    >>> from libcbm_runner.pump.migration import Migration
+    >>> class LowerCase(Migration):
+    >>>     files = ['common/classifiers.csv']
+    >>>     def convert(self, path, text): return text.lower()
+    >>> LowerCase.run(dry_run=True)
+"""
+
+# Built-in modules #
+import os, json, glob, hashlib, difflib, multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Third party modules #
+from tqdm import tqdm
+
+# First party modules #
+
+# Internal modules #
+
+###############################################################################
+class Migration(object):
+    """
+    A conversion of some input files of one country. A subclass declares
+    the files it touches in `files`, relative to the data directory of the
+    country and possibly with wildcards, and implements either `convert`,
+    to change the text of every file independently, or `migrate` to change
+    several files at once, create new ones or remove some.
+
+    Applying a migration to all countries is done in parallel, one country
+    per process, with the `run` class method. Each country keeps a ledger
+    of the migrations applied to it and the hash of the files they left
+    behind in `.migrations.json`. The files are always read and hashed,
+    but a migration is skipped without converting anything when they
+    still have the hashes it left, so that running a migration twice does
+    nothing. Files whose text does not change are never rewritten.
+
+    With `dry_run`, nothing is written and the differences that would be
+    applied are returned instead.
+    """
+
+    # The files touched, relative to the data directory of the country #
+    files = []
+
+    # The file that records what was applied #
+    ledger_name = '.migrations.json'
+
+    def __init__(self, country):
+        # Default attributes #
+        self.country  = country
+        self.data_dir = country.data_dir
+
+    def __repr__(self):
+        return '%s object code "%s"' % (self.__class__,
+                                        self.country.iso2_code)
+
+    #----------------------------- Properties --------------------------------#
+    @property
+    def name(self):
+        """The key of this migration in the ledger."""
+        return self.__class__.__name__
+
+    @property
+    def paths(self):
+        """The absolute paths of the files, with the wildcards expanded."""
+        result = []
+        for pattern in self.files:
+            full = str(self.data_dir + pattern)
+            found = sorted(glob.glob(full)) if glob.has_magic(full) else [full]
+            result += found
+        return result
+
+    @property
+    def ledger_path(self):
+        return str(self.data_dir + self.ledger_name)
+
+    @property
+    def ledger(self):
+        """What was applied to this country, by migration name."""
+        if not os.path.exists(self.ledger_path): return {}
+        with open(self.ledger_path) as handle: return json.load(handle)
+
+    #------------------------------- Methods ---------------------------------#
+    def relative(self, path):
+        """A path relative to the data directory, as stored in the ledger."""
+        return os.path.relpath(path, str(self.data_dir))
+
+    @staticmethod
+    def read(path):
+        """The text of a file or None if it does not exist."""
+        if not os.path.exists(path): return None
+        with open(path) as handle: return handle.read()
+
+    @staticmethod
+    def digest(text):
+        """The hash of the text of a file, None for missing files."""
+        if text is None: return None
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def hashes(self, contents):
+        return {self.relative(p): self.digest(t) for p, t in contents.items()}
+
+    def convert(self, path, text):
+        """
+        Return the new text of one file. Subclasses must implement this
+        method unless they override `migrate` instead.
+        """
+        msg = "The migration '%s' must implement `convert` or `migrate`."
+        raise NotImplementedError(msg % self.name)
+
+    def migrate(self, contents):
+        """
+        Receives a dictionary of the paths to their text, and returns a
+        dictionary of the paths to their new text, where None removes the
+        file. Paths that are not returned are left as they are.
+        """
+        return {path: self.convert(path, text)
+                for path, text in contents.items() if text is not None}
+
+    def __call__(self, dry_run=False):
+        """
+        Apply the migration to this country and return a dictionary with
+        the status, 'skipped', 'unchanged' or 'changed', and the files
+        changed with their differences.
+        """
+        # Read every file #
+        contents = {path: self.read(path) for path in self.paths}
+        before   = self.hashes(contents)
+        # Already applied and nothing was edited since #
+        ledger = self.ledger
+        if ledger.get(self.name) == before:
+            return {'country': self.country.iso2_code, 'status': 'skipped',
+                    'files': {}}
+        # Convert #
+        result  = self.migrate(dict(contents))
+        changes = {p: t for p, t in result.items() if t != contents.get(p)}
+        diffs   = {self.relative(p): self.diff(p, contents.get(p), t)
+                   for p, t in changes.items()}
+        # Write #
+        if not dry_run:
+            for path, text in changes.items(): self.write(path, text)
+            contents.update(result)
+            ledger[self.name] = self.hashes(contents)
+            self.write(self.ledger_path, json.dumps(ledger, indent=4,
+                                                    sort_keys=True) + '\n')
+        # Return #
+        return {'country': self.country.iso2_code,
+                'status':  'changed' if changes else 'unchanged',
+                'files':   diffs}
+
+    def diff(self, path, old, new):
+        """A unified diff between the old and the new text of a file."""
+        old = (old or '').splitlines(keepends=True)
+        new = (new or '').splitlines(keepends=True)
+        name = self.relative(path)
+        return ''.join(difflib.unified_diff(old, new, 'a/' + name,
+                                            'b/' + name))
+
+    @staticmethod
+    def write(path, text):
+        """Replace a file at once, or remove it if the text is None."""
+        if text is None:
+            if os.path.exists(path): os.remove(path)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = path + '.tmp'
+        with open(temp, 'w') as handle: handle.write(text)
+        os.replace(temp, path)
+
+    #------------------------------ Batches ----------------------------------#
+    @classmethod
+    def run(cls, countries=None, dry_run=False, processes=None,
+            verbose=True):
+        """
+        Apply the migration to several countries, all of them by default,
+        in parallel. Returns the result of every country, ordered by
+        country code. With `dry_run` the differences are also printed.
+        """
+        # The countries #
+        from libcbm_runner.core.continent import continent
+        if countries is None: countries = list(continent.countries)
+        # One process per country #
+        results = []
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers = processes,
+                                 mp_context  = context) as pool:
+            futures = [pool.submit(apply_migration, cls, code, dry_run)
+                       for code in countries]
+            done = as_completed(futures)
+            if verbose: done = tqdm(done, total=len(futures))
+            for future in done: results.append(future.result())
+        results.sort(key=lambda r: r['country'])
+        # Print the differences #
+        if verbose and dry_run:
+            for result in results:
+                for text in result['files'].values(): print(text)
+        # Print a summary #
+        if verbose:
+            for status in ('changed', 'unchanged', 'skipped'):
+                codes = [r['country'] for r in results
+                         if r['status'] == status]
+                if codes: print("%s: %s" % (status, ' '.join(codes)))
+        # Return #
+        return results
+
+###############################################################################
+def apply_migration(cls, code, dry_run=False):
+    """Executed in a worker process for every country."""
+    from libcbm_runner.core.continent import continent
+    return cls(continent.countries[code])(dry_run=dry_run)
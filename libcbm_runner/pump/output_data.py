@@ -40,13 +40,14 @@ class OutputData(object):
     /output/csv/state.csv.gz
     """
 
-    def __init__(self, parent):
+    def __init__(self, parent, data_dir=None):
         # Default attributes #
         self.parent = parent
         self.runner = parent
         self.sim    = self.runner.simulation
-        # Directories #
-        self.paths = AutoPaths(self.parent.data_dir, self.all_paths)
+        # Directories, the ones of the runner by default #
+        if data_dir is None: data_dir = self.parent.data_dir
+        self.paths = AutoPaths(data_dir, self.all_paths)
 
     def __repr__(self):
         return '%s object code "%s"' % (self.__class__, self.runner.short_name)
@@ -90,6 +91,9 @@ class OutputData(object):
         Save all the information of interest from the simulation to disk before
         the whole simulation object is removed from memory.
         """
+        # Only aggregated tables are available in that case #
+        if self.runner.combo.reporting == 'aggregate':
+            return self.runner.aggregate.save()
         # Message #
         self.parent.log.info("Saving final simulations results to disk.")
         # The classifier values #
@@ -101,6 +105,46 @@ class OutputData(object):
         self['parameters']  = self.runner.internal['parameters']
         self['pools']       = self.runner.internal['pools']
         self['state']       = self.runner.internal['state']
+        # Optionally also in a database indexed for point queries #
+        if self.runner.combo.results_db: self.runner.results_db.write(
+            classifiers = self.runner.internal.classif_df,
+            flux        = self.runner.internal['flux'],
+            parameters  = self.runner.internal['parameters'],
+            pools       = self.runner.internal['pools'],
+            state       = self.runner.internal['state'])
+
+    def expand(self, df, scale=True):
+        """
+        When the inventory was compacted before the simulation, expand a
+        per-stand table back to one row per original inventory record.
+        The original record is given in the `original_id` column. If `scale`
+        is True, all value columns are multiplied by the share of the area
+        of the compacted stand that the original record represents, which
+        is correct for pools, fluxes and area but not for state variables.
+        Stands created during the simulation by disturbances splitting a
+        stand have no original record and are kept as they are.
+        """
+        # Nothing to do if the inventory was not compacted #
+        mapping_path = self.runner.pre_processor.paths.inventory_map
+        if not mapping_path.exists: return df
+        mapping = pandas.read_csv(str(mapping_path))
+        # Join #
+        values = [c for c in df.columns if c not in ('identifier', 'timestep')]
+        df = df.merge(mapping, 'left', 'identifier')
+        df['fraction'] = df['fraction'].fillna(1.0)
+        # Scale #
+        if scale: df[values] = df[values].multiply(df['fraction'], axis=0)
+        # Return #
+        return df.drop(columns=['fraction'])
+
+    def query(self, table, identifier=None, timestep=None, **classifiers):
+        """
+        Read only the rows of some stands, timesteps or classifier values
+        from the SQLite copy of the results, without loading the CSV files
+        (see `ResultsDB`).
+        """
+        return self.runner.results_db.query(table, identifier, timestep,
+                                            **classifiers)
 
     def load(self, name, with_clfrs=True):
         """
@@ -11,31 +11,217 @@ Unit D1 Bioeconomy.
 # Built-in modules #
 
 # Third party modules #
+import pandas
 
 # First party modules #
+from autopaths.auto_paths import AutoPaths
 
 # Internal modules #
 
 ###############################################################################
 class PostProcessor(object):
     """
-    This class will xxxx.
+    This class will compute a standard set of carbon indicators from the
+    results of a runner once the simulation is finished. The indicators are
+    summed by the classifiers listed in the combo's `group_by` attribute and
+    by year, so that continent-wide reporting never needs the per-stand
+    tables:
+
+        * `area`:                  the area of the group.
+        * `total_ecosystem_c`:     biomass, dead organic matter and snags.
+        * `npp`:                   net primary production, i.e. the growth
+                                   of biomass plus the litter turnover.
+        * `rh`:                    heterotrophic respiration from decay.
+        * `nep`:                   net ecosystem production (npp - rh).
+        * `disturbance_emissions`: carbon released to the air by
+                                   disturbances.
+        * `harvested_c`:           carbon transferred to products.
+        * `nbp`:                   net biome production, i.e. nep minus the
+                                   disturbance emissions and harvest.
+        * `sink`:                  True if the group is a carbon sink.
+
+    The per-stand pools and flux tables saved on disk are read in chunks,
+    together with the classifiers table, so they are never loaded whole.
+    The tables are all written timestep after timestep, so only the
+    classifiers of the timesteps in the current chunk are kept in memory.
+    With the 'aggregate' reporting, the aggregated tables are used directly.
+
+    Any error is logged instead of stopping the other runners, as the
+    results of the simulation are still published without the indicators.
+
+        >>> print(runner.post_processor.load())
+    """
+
+    all_paths = """
+    /output/indicators/
+    /output/indicators/indicators.csv.gz
     """
 
+    # Number of rows read at once from the per-stand tables #
+    chunk_size = 10**6
+
+    # The flux indicators that make up every carbon indicator #
+    growth    = ['delta_biomass_ag', 'delta_biomass_bg']
+    turnover  = ['turnover_merch_litter_input', 'turnover_fol_litter_input',
+                 'turnover_oth_litter_input', 'turnover_coarse_litter_input',
+                 'turnover_fine_litter_input']
+    decay     = ['decay_domco2_emission']
+    emissions = ['disturbance_co2_production', 'disturbance_ch4_production',
+                 'disturbance_co_production']
+    harvest   = ['disturbance_soft_production', 'disturbance_hard_production',
+                 'disturbance_dom_production']
+
+    # The pools that are part of the forest ecosystem #
+    ecosystem = ['softwood_merch', 'softwood_foliage', 'softwood_other',
+                 'softwood_coarse_roots', 'softwood_fine_roots',
+                 'hardwood_merch', 'hardwood_foliage', 'hardwood_other',
+                 'hardwood_coarse_roots', 'hardwood_fine_roots',
+                 'above_ground_very_fast_soil', 'below_ground_very_fast_soil',
+                 'above_ground_fast_soil', 'below_ground_fast_soil',
+                 'medium_soil', 'above_ground_slow_soil',
+                 'below_ground_slow_soil', 'softwood_stem_snag',
+                 'softwood_branch_snag', 'hardwood_stem_snag',
+                 'hardwood_branch_snag']
+
     def __init__(self, parent):
         # Default attributes #
         self.parent = parent
         self.runner = parent
+        # Set to True if the post-processing failed #
+        self.error  = None
+        # Directories #
+        self.paths = AutoPaths(self.parent.data_dir, self.all_paths)
 
     def __repr__(self):
         return '%s object code "%s"' % (self.__class__, self.runner.short_name)
 
+    # noinspection PyBroadException
     def __call__(self):
         """
-        xxxx.
+        Wrap the `run()` method by catching any type of exception and
+        logging it, like `Simulation`. Returns None on failure.
         """
-        return
+        try:
+            self.error = False
+            return self.run()
+        except Exception:
+            message = "Runner '%s' failed to post-process. See log file."
+            self.runner.log.error(message % self.runner.short_name)
+            self.runner.log.exception("Exception", exc_info=True)
+            self.error = True
+
+    def run(self):
+        """Compute the indicators and save them to disk."""
         # Message #
         self.parent.log.info("Post-processing results.")
-        # Lorem #
-        pass
\ No newline at end of file
+        # The sums by group and timestep #
+        if self.runner.combo.reporting == 'aggregate':
+            pools = self.runner.aggregate['pools']
+            flux  = self.runner.aggregate['flux']
+        else:
+            pools = self.stream('pools')
+            flux  = self.stream('flux')
+        # Compute #
+        df = self.indicators(pools, flux)
+        # Write to disk #
+        df.to_csv(str(self.paths.indicators),
+                  index        = False,
+                  float_format = '%g',
+                  compression  = 'gzip')
+        # Harvested wood products #
+        self.runner.hwp(df)
+        # Add this runner to the results of all combos #
+        self.runner.combo.continent.cube.add(self.runner,
+                                             pools      = pools,
+                                             flux       = flux,
+                                             indicators = df)
+        # Return #
+        return df
+
+    #----------------------------- Properties --------------------------------#
+    @property
+    def keys(self):
+        """The columns that the indicators are summed by."""
+        return list(self.runner.combo.group_by) + ['timestep']
+
+    #------------------------------- Methods ---------------------------------#
+    @staticmethod
+    def total(df, columns):
+        """Sum the columns that are present in the data frame."""
+        return df[[col for col in columns if col in df.columns]].sum(axis=1)
+
+    def stream(self, name, columns=None):
+        """
+        Read one of the per-stand tables in chunks and sum the columns
+        given, or all of them, by group of classifiers and timestep.
+        """
+        # Paths #
+        output = self.runner.output
+        path   = str(output.paths[name])
+        index  = ['identifier', 'timestep']
+        # Only the columns that exist in this table #
+        header = pandas.read_csv(path, nrows=0).columns
+        if columns is None: columns = [c for c in header if c not in index]
+        else: columns = [col for col in columns if col in header]
+        # The classifier of every stand at every timestep, also in chunks #
+        group = list(self.runner.combo.group_by)
+        clfrs = pandas.read_csv(str(output.paths.classifiers),
+                                usecols=index + group,
+                                chunksize=self.chunk_size)
+        # Sum every chunk #
+        parts   = []
+        pending = []
+        chunks  = pandas.read_csv(path, usecols=index + columns,
+                                  chunksize=self.chunk_size)
+        for chunk in chunks:
+            last = chunk['timestep'].max()
+            # Read the classifiers past the last timestep of this chunk #
+            while not pending or pending[-1]['timestep'].iloc[-1] <= last:
+                try: pending.append(next(clfrs))
+                except StopIteration: break
+            current = pandas.concat(pending)
+            chunk   = chunk.merge(current, 'left', index)
+            parts.append(chunk.groupby(self.keys)[columns].sum())
+            # The next chunks only need this timestep and later ones #
+            current = current[current['timestep'] >= last]
+            pending = [current] if not current.empty else []
+        # Sum the chunks together #
+        df = pandas.concat(parts).groupby(level=self.keys).sum()
+        df = df.reset_index()
+        # Put actual values such as 'OB' instead of numbers like '6' #
+        values = output['values']
+        for clfr in group:
+            names = {v: k for k, v in values[clfr].items()}
+            df[clfr] = df[clfr].map(names)
+        # Return #
+        return df
+
+    def indicators(self, pools, flux):
+        """
+        Compute the indicators from the pools and flux tables, that are
+        already summed by group and timestep.
+        """
+        # Stocks #
+        stocks = pools[self.keys].copy()
+        stocks['area']              = pools['area']
+        stocks['total_ecosystem_c'] = self.total(pools, self.ecosystem)
+        # Fluxes #
+        fluxes = flux[self.keys].copy()
+        fluxes['npp']  = self.total(flux, self.growth + self.turnover)
+        fluxes['rh']   = self.total(flux, self.decay)
+        fluxes['nep']  = fluxes['npp'] - fluxes['rh']
+        fluxes['disturbance_emissions'] = self.total(flux, self.emissions)
+        fluxes['harvested_c']           = self.total(flux, self.harvest)
+        fluxes['nbp']  = fluxes['nep'] - fluxes['disturbance_emissions'] \
+                                       - fluxes['harvested_c']
+        # Combine #
+        df = stocks.merge(fluxes, 'outer', self.keys)
+        df['sink'] = df['nbp'] > 0
+        # Add year #
+        df['year'] = self.runner.country.timestep_to_year(df['timestep'])
+        # Return #
+        return df
+
+    def load(self):
+        """Load the indicators that were previously computed."""
+        return pandas.read_csv(str(self.paths.indicators), compression='gzip')
@@ -11,12 +11,14 @@ Unit D1 Bioeconomy.
 # Built-in modules #
 
 # Third party modules #
-import pandas
+import numpy, pandas
 
 # First party modules #
+from autopaths.auto_paths import AutoPaths
 
 # Internal modules #
 from libcbm_runner.pump.column_order import events_cols
+from libcbm_runner.launch.harvest    import HarvestAllocator
 
 ###############################################################################
 class PreProcessor(object):
@@ -24,11 +26,18 @@ class PreProcessor(object):
     This class will update the input data of a runner based on a set of rules.
     """
 
+    all_paths = """
+    /input/compact/
+    /input/compact/inventory_map.csv
+    """
+
     def __init__(self, parent):
         # Default attributes #
         self.parent  = parent
         self.runner  = parent
         self.country = parent.country
+        # Directories #
+        self.paths = AutoPaths(self.parent.data_dir, self.all_paths)
         # Shortcuts #
         self.input = self.runner.input_data
 
@@ -45,6 +54,10 @@ class PreProcessor(object):
         self.reshape_events()
         # Check there are no negative timesteps #
         self.raise_bad_timestep()
+        # Optionally replace the harvest events by the demand #
+        if self.runner.combo.demand_harvest: self.drop_demand_harvest()
+        # Optionally merge identical inventory records #
+        if self.runner.combo.compact_inventory: self.compact_inventory()
 
     #----------------------------- Properties --------------------------------#
     @property
@@ -105,6 +118,67 @@ class PreProcessor(object):
               " year that is anterior to the inventory start year configured."
         raise Exception(msg % (path, negative_values.sum()))
 
+    def drop_demand_harvest(self):
+        """
+        When the harvest is allocated from the demand during the simulation
+        (see `HarvestAllocator`), remove the events of the same disturbance
+        type in the years that have a demand, so that it is not cut twice.
+        """
+        # Load from disk #
+        path = self.input.paths.events
+        try: df = pandas.read_csv(str(path))
+        # If the file is empty we can skip it #
+        except pandas.errors.EmptyDataError: return
+        # The years covered by the demand #
+        demand = HarvestAllocator(self.runner.simulation).demand
+        years  = numpy.asarray(self.country.timestep_to_year(df['step']))
+        # The events replaced #
+        dist_type = str(self.runner.combo.demand_harvest)
+        drop = (df['dist_type_name'].astype(str) == dist_type).to_numpy()
+        drop = drop & numpy.isin(years, demand.index.to_numpy())
+        # Message #
+        msg = "Dropping %i harvest events replaced by the demand."
+        self.parent.log.info(msg % drop.sum())
+        # Write to disk #
+        df[~drop].to_csv(str(path), index=False)
+
+    def compact_inventory(self):
+        """
+        Merge the inventory records that are identical in every column
+        except the area, summing their areas. Each record becomes a stand
+        in `libcbm`, so this reduces the number of stands to simulate.
+
+        A mapping from every original record to its compacted record is
+        written to disk, along with the share of the area it represents,
+        so that per-stand outputs can be expanded back afterwards with
+        `runner.output.expand()`.
+        """
+        # Load from disk #
+        path = self.input.paths.inventory
+        try: df = pandas.read_csv(str(path))
+        except pandas.errors.EmptyDataError: return
+        if df.empty: return
+        # Group on every column except the area, keeping the order #
+        cols   = [col for col in df.columns if col != 'area']
+        groups = df.groupby(cols, sort=False, dropna=False)
+        # The compacted record of every original record #
+        number = groups.ngroup()
+        total  = groups['area'].transform('sum')
+        # Build the mapping, identifiers are one-based in `libcbm` #
+        mapping = pandas.DataFrame({'original_id': df.index + 1,
+                                    'identifier':  number.values + 1,
+                                    'fraction':    df['area'] / total})
+        # Build the compacted inventory #
+        compact = groups['area'].sum().reset_index()
+        compact = compact[df.columns]
+        # Message #
+        msg = "Compacted the inventory from %i to %i records."
+        self.parent.log.info(msg % (len(df), len(compact)))
+        # Write to disk #
+        self.paths.compact_dir.create_if_not_exists()
+        mapping.to_csv(str(self.paths.inventory_map), index=False)
+        compact.to_csv(str(path), index=False)
+
     #------------------------ Dataframe conversions --------------------------#
     def events_wide_to_long(self, events):
         """Reshape disturbance events from wide to long format."""
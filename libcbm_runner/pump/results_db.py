@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Written by Lucas Sinclair and Paul Rougieux.
+
+JRC Biomass Project.
+Unit D1 Bioeconomy.
+"""
+
+# Built-in modules #
+import os, sqlite3
+from contextlib import closing
+
+# Third party modules #
+import numpy, pandas
+
+# First party modules #
+from autopaths.auto_paths import AutoPaths
+
+# Internal modules #
+
+###############################################################################
+class ResultsDB(object):
+    """
+    An optional copy of the per-stand results of a runner in an SQLite
+    database, where every table is indexed on `(identifier, timestep)` and
+    the classifiers table also on every classifier. Looking up the
+    trajectory of a few stands takes milliseconds and does not need to
+    decompress and parse the CSV files of `OutputData`:
+
+        >>> runner.output.query('pools', identifier=[12, 13])
+        >>> runner.output.query('flux', timestep=5, region='LU00')
+
+    Enabled by setting the `results_db` attribute of the combo to True.
+    The database is written in bulk, in one transaction per table, in the
+    output directory of the runner.
+
+    When the inventory was compacted (see `PreProcessor.compact_inventory`)
+    the database holds the compacted stands, but queries take and return
+    the identifiers of the original inventory records, in the `original_id`
+    column, like `OutputData.expand` does.
+    """
+
+    all_paths = """
+    /output/db/results.sqlite
+    """
+
+    # The columns every table is indexed on #
+    keys = ['identifier', 'timestep']
+
+    # How many rows are inserted at once #
+    chunk_size = 100000
+
+    # The tables whose values are split between the original records #
+    scaled = ['pools', 'flux', 'area']
+
+    def __init__(self, parent):
+        # Default attributes #
+        self.parent = parent
+        self.runner = parent
+        # Directories #
+        self.paths = AutoPaths(self.parent.data_dir, self.all_paths)
+
+    def __repr__(self):
+        return '%s object code "%s"' % (self.__class__, self.runner.short_name)
+
+    def __bool__(self): return self.paths.results.exists
+
+    #----------------------------- Properties --------------------------------#
+    @property
+    def connection(self):
+        """A new connection to the database."""
+        return sqlite3.connect(str(self.paths.results))
+
+    @property
+    def classifier_names(self):
+        """The classifier columns of the classifiers table."""
+        return self.columns('classifiers')
+
+    @property
+    def mapping(self):
+        """The original record of every compacted stand, if any."""
+        path = self.runner.pre_processor.paths.inventory_map
+        if not path.exists: return None
+        return pandas.read_csv(str(path))
+
+    #------------------------------- Methods ---------------------------------#
+    def write(self, classifiers, **tables):
+        """
+        Create the database from the classifiers table, with the values
+        decoded, and the other per-stand tables.
+        """
+        # Message #
+        self.runner.log.info("Writing the results to an SQLite database.")
+        # Start from scratch #
+        path = str(self.paths.results)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix): os.remove(path + suffix)
+        # Write #
+        con = self.connection
+        try:
+            # Fast bulk loading, the file is rewritten on failure anyway #
+            con.execute("PRAGMA journal_mode = WAL")
+            con.execute("PRAGMA synchronous = OFF")
+            # Every table #
+            tables = dict(tables, classifiers=classifiers)
+            for name, df in tables.items():
+                with con:
+                    df.to_sql(name, con, index=False,
+                              chunksize=self.chunk_size)
+                    self.index(con, name, self.keys)
+            # Classifiers can be used as filters #
+            with con:
+                for column in classifiers.columns:
+                    if column in self.keys: continue
+                    self.index(con, 'classifiers', [column])
+            # Update the statistics of the query planner #
+            con.execute("ANALYZE")
+        finally:
+            con.close()
+
+    def columns(self, table):
+        """The columns of a table, except the keys."""
+        with closing(self.connection) as con:
+            cursor = con.execute('PRAGMA table_info("%s")' % table)
+            names  = [row[1] for row in cursor]
+        return [n for n in names if n not in self.keys]
+
+    @staticmethod
+    def as_list(value):
+        """A filter value as a list of plain python objects for sqlite."""
+        if numpy.ndim(value) == 0: value = [value]
+        return [v.item() if isinstance(v, numpy.generic) else v
+                for v in value]
+
+    @staticmethod
+    def index(con, table, columns):
+        """Create an index on some columns of a table."""
+        name = 'idx_%s_%s' % (table, '_'.join(columns))
+        cols = ', '.join('"%s"' % c for c in columns)
+        con.execute('CREATE INDEX "%s" ON "%s" (%s)' % (name, table, cols))
+
+    def query(self, table, identifier=None, timestep=None, **classifiers):
+        """
+        Return the rows of a table for some stands, timesteps and
+        classifier values. Every filter can be a single value or a list.
+        The classifier columns are joined to the result.
+        """
+        # Check #
+        if not self:
+            msg = "No results database for runner '%s', set `results_db`."
+            raise FileNotFoundError(msg % self.runner.short_name)
+        # Original records are looked up through their compacted stand #
+        mapping, originals = self.mapping, None
+        if mapping is not None and identifier is not None:
+            originals  = self.as_list(identifier)
+            chosen     = mapping['original_id'].isin(originals)
+            identifier = mapping.loc[chosen, 'identifier'].unique()
+        # Build the filters #
+        filters = dict(identifier=identifier, timestep=timestep)
+        filters = {'t.' + k: v for k, v in filters.items() if v is not None}
+        filters.update({'c."%s"' % k: v for k, v in classifiers.items()})
+        where, params = [], []
+        for column, value in filters.items():
+            value = self.as_list(value)
+            if not value: value = [None]
+            where.append("%s IN (%s)" % (column, ', '.join('?' * len(value))))
+            params += value
+        # Join the classifiers, unless we are reading them #
+        if table == 'classifiers':
+            sql = 'SELECT * FROM classifiers AS t'
+            where = [w.replace('c."', 't."') for w in where]
+        else:
+            names = ', '.join('c."%s"' % n for n in self.classifier_names)
+            sql = 'SELECT t.*, %s FROM "%s" AS t ' \
+                  'JOIN classifiers AS c USING (identifier, timestep)'
+            sql = sql % (names, table)
+        if where: sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY t.identifier, t.timestep'
+        # Run #
+        with closing(self.connection) as con:
+            df = pandas.read_sql_query(sql, con, params=params)
+        # Expand back to the original records #
+        if mapping is not None: df = self.expand(df, table, mapping, originals)
+        # Add the year #
+        df['year'] = self.runner.country.timestep_to_year(df['timestep'])
+        # Return #
+        return df
+
+    def expand(self, df, table, mapping, originals=None):
+        """
+        One row per original record of every compacted stand, with the
+        values of pools and fluxes scaled by its share of the area. Stands
+        created by splits during the simulation have no original record.
+        """
+        df = df.merge(mapping, 'left', 'identifier')
+        df['fraction'] = df['fraction'].fillna(1.0)
+        if table in self.scaled:
+            values = [c for c in self.columns(table) if c in df.columns]
+            df[values] = df[values].multiply(df['fraction'], axis=0)
+        if originals is not None: df = df[df['original_id'].isin(originals)]
+        return df.drop(columns=['fraction']).reset_index(drop=True)
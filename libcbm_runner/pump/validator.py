@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Written by Lucas Sinclair and Paul Rougieux.
+
+JRC Biomass Project.
+Unit D1 Bioeconomy.
+"""
+
+# Built-in modules #
+
+# Third party modules #
+import pandas
+
+# First party modules #
+
+# Internal modules #
+
+###############################################################################
+class InvalidInputsError(ValueError):
+    """Raised when the inputs of a runner have problems."""
+
+###############################################################################
+class Validator(object):
+    """
+    This class checks the final inputs of a runner, as written to disk
+    after `modify_input` and the pre-processing, before the simulation
+    starts. Errors that would otherwise only appear inside `libcbm` while
+    loading the SIT, or after the spin-up, are found here in a few seconds:
+
+        * Classifier values in the inventory, events, transitions and
+          growth curves that are not defined in `classifiers.csv`.
+        * Disturbance types in the events and transitions that are not
+          defined in `disturbance_types.csv`.
+        * Associations in `config/associations.csv` whose input names are
+          not classifier values or disturbance types, or whose AIDB names
+          do not exist in the AIDB.
+        * Inventory records without any matching growth curve.
+
+    All problems are collected and returned at once:
+
+        >>> problems = runner.validator()
+        >>> runner.validator.raise_if_invalid()
+
+    The files are read from the input directory of the runner, so this is
+    called by `Runner.prepare` once they have been created.
+    """
+
+    # The wildcard that matches any classifier value #
+    wildcard = '?'
+
+    # The association categories, the classifier they map and AIDB table #
+    categories = {'MapAdminBoundary':   ('region',      'admin_boundary_tr'),
+                  'MapEcoBoundary':     ('climate',     'eco_boundary_tr'),
+                  'MapSpecies':         ('forest_type', 'species_tr'),
+                  'MapDisturbanceType': (None,          'disturbance_type_tr')}
+
+    def __init__(self, parent):
+        # Default attributes #
+        self.parent  = parent
+        self.runner  = parent
+        self.country = parent.country
+
+    def __repr__(self):
+        return '%s object code "%s"' % (self.__class__, self.runner.short_name)
+
+    def __call__(self):
+        """Return a list of messages describing every problem found."""
+        # Read the final input files #
+        self.inventory     = self.load('inventory')
+        self.events        = self.load('events')
+        self.transitions   = self.load('transitions')
+        self.growth_curves = self.load('growth_curves')
+        # Run every check #
+        problems  = self.check_classifiers()
+        problems += self.check_disturbances()
+        problems += self.check_associations()
+        problems += self.check_growth_curves()
+        # Prefix with the runner name #
+        return ["%s: %s" % (self.runner.short_name, p) for p in problems]
+
+    #----------------------------- Properties --------------------------------#
+    @property
+    def input(self):
+        """The input data of the runner, which follows its staging."""
+        return self.runner.input_data
+
+    @property
+    def classifiers(self):
+        """
+        A dictionary of classifier names to the set of their values, in the
+        order of the classifier numbers.
+        """
+        df = self.load('classifiers')
+        is_header = df['classifier_value_id'] == '_CLASSIFIER'
+        names  = df[is_header].set_index('classifier_number')['name']
+        values = df[~is_header].groupby('classifier_number')
+        values = values['classifier_value_id'].apply(set)
+        return {names[num]: values.get(num, set()) for num in names.index}
+
+    @property
+    def disturbance_ids(self):
+        """The identifiers of the disturbance types as strings."""
+        df = self.load('disturbance_types')
+        return set(df.iloc[:, 0].astype(str))
+
+    #------------------------------- Methods ---------------------------------#
+    def load(self, name):
+        """One of the input files, or an empty data frame if it is empty."""
+        try: return self.input[name]
+        except pandas.errors.EmptyDataError: return pandas.DataFrame()
+
+    def unknown_values(self, file_name, column, values, allowed):
+        """
+        Return a message if some values of a column are not allowed,
+        otherwise an empty list.
+        """
+        values  = values.dropna().astype(str)
+        missing = values[~values.isin(allowed)].unique()
+        if len(missing) == 0: return []
+        msg = "in '%s', column '%s' has %i unknown values: %s."
+        return [msg % (file_name, column, len(missing), sorted(missing)[:10])]
+
+    def check_classifiers(self):
+        """Every classifier value used must be defined."""
+        problems = []
+        classifiers = self.classifiers
+        names = list(classifiers)
+        # Inventory cannot use wildcards #
+        for name in names:
+            if name not in self.inventory.columns: continue
+            problems += self.unknown_values('inventory', name,
+                                            self.inventory[name],
+                                            classifiers[name])
+        # Events and growth curves can #
+        for file_name in ['events', 'growth_curves']:
+            df = getattr(self, file_name)
+            for name in names:
+                if name not in df.columns: continue
+                allowed = classifiers[name] | {self.wildcard}
+                problems += self.unknown_values(file_name, name, df[name],
+                                                allowed)
+        # Transitions have source and destination classifiers by position #
+        df, n = self.transitions, len(names)
+        if not df.empty:
+            source = df.columns[:n]
+            destin = df.columns[n+6:2*n+6]
+            for name, src, dst in zip(names, source, destin):
+                allowed = classifiers[name] | {self.wildcard}
+                for col in (src, dst):
+                    problems += self.unknown_values('transitions', col,
+                                                    df[col], allowed)
+        # Return #
+        return problems
+
+    def check_disturbances(self):
+        """Every disturbance type used must be defined."""
+        problems = []
+        allowed = self.disturbance_ids
+        # Events #
+        if 'dist_type_name' in self.events.columns:
+            problems += self.unknown_values('events', 'dist_type_name',
+                                            self.events['dist_type_name'],
+                                            allowed)
+        # Transitions, the column is after the classifiers and ages #
+        df, n = self.transitions, len(self.classifiers)
+        if not df.empty:
+            col = df.columns[n+5]
+            problems += self.unknown_values('transitions', col, df[col],
+                                            allowed)
+        # Return #
+        return problems
+
+    def check_associations(self):
+        """Every association must link existing names on both sides."""
+        problems = []
+        df = self.country.associations.df
+        classifiers = self.classifiers
+        # The names of the disturbance types #
+        dist = self.load('disturbance_types')
+        dist_names = set(dist.iloc[:, 1].astype(str))
+        # Check the AIDB exists #
+        aidb = self.country.aidb
+        if not aidb:
+            return ["the AIDB at '%s' was not found." % aidb.paths.aidb]
+        # Every category #
+        for category, (clfr, table) in self.categories.items():
+            rows = df.query("category == '%s'" % category)
+            # The input side #
+            if clfr is None: allowed = dist_names
+            else: allowed = classifiers.get(clfr, set())
+            problems += self.unknown_values('associations',
+                                            category + ' name_input',
+                                            rows['name_input'], allowed)
+            # The AIDB side #
+            aidb_names = set(aidb.db.read_df(table)['name'].astype(str))
+            problems += self.unknown_values('associations',
+                                            category + ' name_aidb',
+                                            rows['name_aidb'], aidb_names)
+        # Return #
+        return problems
+
+    def check_growth_curves(self):
+        """Every inventory record must have at least one growth curve."""
+        # The classifiers present in both files #
+        names = [n for n in self.classifiers
+                 if n in self.inventory.columns
+                 and n in self.growth_curves.columns]
+        if self.inventory.empty or not names: return []
+        # Distinct classifier sets of the inventory #
+        inv = self.inventory[names].astype(str).drop_duplicates()
+        # The growth period changes to 'Cur' after the first timestep #
+        if 'growth_period' in names:
+            cur = inv.assign(growth_period='Cur')
+            inv = pandas.concat([inv, cur]).drop_duplicates()
+        inv = inv.reset_index(drop=True)
+        # Group the curves by which columns are wildcards #
+        curves   = self.growth_curves[names].astype(str)
+        patterns = curves == self.wildcard
+        covered  = pandas.Series(False, index=inv.index)
+        for pattern, group in curves.groupby(patterns.apply(tuple, axis=1)):
+            cols = [n for n, wild in zip(names, pattern) if not wild]
+            if not cols:
+                covered[:] = True
+                break
+            keys = group[cols].drop_duplicates()
+            hits = inv.reset_index().merge(keys, 'inner', cols)['index']
+            covered[hits] = True
+        # Report #
+        missing = inv[~covered]
+        if missing.empty: return []
+        msg = "%i classifier sets of the inventory have no growth curve," \
+              " for instance: %s."
+        example = dict(missing.iloc[0])
+        return [msg % (len(missing), example)]
+
+    def raise_if_invalid(self):
+        """Raise an exception listing every problem found."""
+        problems = self()
+        if not problems: return
+        msg = "Invalid inputs:\n" + "\n".join(problems)
+        raise InvalidInputsError(msg)
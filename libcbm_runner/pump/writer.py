@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Written by Lucas Sinclair and Paul Rougieux.
+
+JRC Biomass Project.
+Unit D1 Bioeconomy.
+"""
+
+# Built-in modules #
+import queue, atexit, threading
+
+# Third party modules #
+
+# First party modules #
+
+# Internal modules #
+
+###############################################################################
+class BackgroundWriter(object):
+    """
+    A thread that saves the results of runners to disk while the main
+    thread already prepares and simulates the next runner. Compressing the
+    output tables takes a large part of the time of a runner, and `zlib`
+    releases the GIL while it compresses.
+
+        >>> from libcbm_runner.pump.writer import writer
+        >>> for runner in runners: runner.run(background=True)
+        >>> writer.wait()
+
+    Every job keeps the results of a whole simulation in memory until it is
+    written. To bound the memory used, `submit` blocks when `max_pending`
+    jobs are already waiting or being written. With the default of one,
+    at most two simulations are held in memory: the one being written and
+    the one that just finished and waits to be submitted.
+    """
+
+    def __init__(self, max_pending=1):
+        # Base attributes #
+        self.max_pending = max_pending
+        # The jobs waiting to be run #
+        self.queue  = queue.Queue()
+        # Taken by every job until it is done, not only while it waits #
+        self.slots  = threading.BoundedSemaphore(max_pending)
+        # The exceptions raised by jobs, reported by `wait` #
+        self.errors = []
+        # Started when the first job is submitted #
+        self.thread = None
+
+    def __repr__(self):
+        msg = '%s object with %i jobs pending'
+        return msg % (self.__class__, self.queue.qsize())
+
+    #------------------------------- Methods ---------------------------------#
+    def submit(self, func, *args, **kwargs):
+        """Queue a function to be called in the writer thread."""
+        # Start the thread if needed #
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target = self.loop,
+                                           name   = 'libcbm-writer',
+                                           daemon = True)
+            self.thread.start()
+        # Blocks if too many jobs are pending #
+        self.slots.acquire()
+        self.queue.put((func, args, kwargs))
+
+    def loop(self):
+        """Run the jobs one after the other, forever."""
+        while True:
+            func, args, kwargs = self.queue.get()
+            try: func(*args, **kwargs)
+            except Exception as error: self.errors.append(error)
+            finally:
+                self.slots.release()
+                self.queue.task_done()
+
+    def wait(self):
+        """
+        Block until all the jobs submitted are done. If any of them failed,
+        the first exception is raised here.
+        """
+        self.queue.join()
+        errors, self.errors = self.errors, []
+        if errors: raise errors[0]
+
+###############################################################################
+# Create singleton #
+writer = BackgroundWriter()
+
+# Never exit with results that were not written #
+atexit.register(writer.queue.join)
@@ -26,56 +26,40 @@ hit the country start year.
 # Built-in modules #
 
 # Third party modules #
-from tqdm import tqdm
 
 # First party modules #
 from plumbing.cache import property_cached
 
 # Internal modules #
-from libcbm_runner.core.continent import continent as libcbm_continent
+from libcbm_runner.pump.migration import Migration
 
 # Continents #
 from cbmcfs3_runner.core.continent import continent as cbmcfs3_continent
 
 ###############################################################################
-class MergeGrowthCurves(object):
+class MergeGrowthCurves(Migration):
 
-    def __init__(self, cbmcfs3_country):
-        # Main attributes #
-        self.cbmcfs3_country = cbmcfs3_country
+    files = ['orig/csv/growth_curves.csv', 'orig/csv/yield.csv']
 
     @property_cached
-    def libcbm_country(self):
-        """The matching libcbm country object."""
-        return libcbm_continent.countries[self.cbmcfs3_country.iso2_code]
+    def cbmcfs3_country(self):
+        """The matching cbmcfs3 country object."""
+        return cbmcfs3_continent.countries[self.country.iso2_code]
 
-    def __call__(self, verbose=False):
+    def migrate(self, contents):
         # Get paths #
         hist_curves = self.cbmcfs3_country.orig_data.paths.yields
         curr_curves = self.cbmcfs3_country.orig_data.paths.historical_yields
-        destination = self.libcbm_country.orig_data.paths.growth_curves
-        # Print output #
-        if verbose:
-            print(hist_curves)
-            print(curr_curves)
-            print(destination)
-            print('----')
+        destination, old_file = self.paths
         # Combine #
-        hist_curves.copy(destination)
-        lines = iter(curr_curves)
-        next(lines)
-        destination.writelines(lines, mode='a')
+        hist_lines = hist_curves.contents.splitlines(keepends=True)
+        curr_lines = curr_curves.contents.splitlines(keepends=True)
         # Check headers are the same #
-        assert hist_curves.first == curr_curves.first == destination.first
-        # Remove old file #
-        old_file = self.libcbm_country.data_dir + '/orig/csv/yield.csv'
-        old_file.remove()
+        assert hist_lines[0] == curr_lines[0]
+        # Write the destination and remove old file #
+        return {destination: ''.join(hist_lines + curr_lines[1:]),
+                old_file:    None}
 
 ###############################################################################
 if __name__ == '__main__':
-    # Make converter objects, one per country #
-    mergers = [MergeGrowthCurves(c) for c in cbmcfs3_continent]
-    # Run them all #
-    for merger in tqdm(mergers):
-        merger()
-
+    MergeGrowthCurves.run(countries=list(cbmcfs3_continent.countries))
@@ -11,18 +11,18 @@ A script to harmonize the names of classifiers in every country to snake_case.
 """
 
 # Built-in modules #
+import io
 
 # Third party modules #
 import pandas
-from tqdm import tqdm
 
 # First party modules #
 
 # Internal modules #
-from libcbm_runner.core.continent import continent
+from libcbm_runner.pump.migration import Migration
 
 ###############################################################################
-class ClassifierRenamer(object):
+class ClassifierRenamer(Migration):
     """
     `Forest type` becomes `forest_type` etc.
     """
@@ -39,21 +39,16 @@ class ClassifierRenamer(object):
         'Simulation period (for yields)' : 'growth_period',
     }
 
-    def __init__(self, country):
-        # Default attributes #
-        self.country = country
+    files = ['common/classifiers.csv']
 
-    def __call__(self):
-        # Get path #
-        path = self.country.orig_data.paths.classifiers
+    def convert(self, path, text):
         # Load dataframe #
-        df = pandas.read_csv(str(path))
+        df = pandas.read_csv(io.StringIO(text))
         # Modify dataframe #
         df['name'] = df['name'].replace(self.mapping)
-        # Write dataframe back to disk #
-        df.to_csv(str(path), index=False, float_format='%g')
+        # Return the new text #
+        return df.to_csv(index=False, float_format='%g')
 
 ###############################################################################
 if __name__ == '__main__':
-    renamers = [ClassifierRenamer(c) for c in continent]
-    for renamer in tqdm(renamers): renamer()
\ No newline at end of file
+    ClassifierRenamer.run()
\ No newline at end of file
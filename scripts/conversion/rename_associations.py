@@ -9,7 +9,7 @@ Unit D1 Bioeconomy.
 
 This script will rename the header column of the file:
 
-* /common/associations.csv
+* /config/associations.csv
 
 Before running this script the headers are simply "A", "B", "C".
 
@@ -21,37 +21,29 @@ After running this script, the new headers will be:
 """
 
 # Built-in modules #
+import io
 
 # Third party modules #
 import pandas
-from tqdm import tqdm
 
 # First party modules #
 
 # Internal modules #
-from libcbm_runner.core.continent import continent
+from libcbm_runner.pump.migration import Migration
 
 ###############################################################################
-class RenameAssociations(object):
+class RenameAssociations(Migration):
 
-    def __init__(self, country):
-        # Main attributes #
-        self.country = country
+    files = ['config/associations.csv']
 
-    def __call__(self, verbose=False):
-        # Get path #
-        path = self.country.orig_data.paths.associations
+    def convert(self, path, text):
         # Load dataframe #
-        df = pandas.read_csv(str(path))
+        df = pandas.read_csv(io.StringIO(text))
         # Modify dataframe #
         df.columns = ["category", "name_input", "name_aidb"]
-        # Write dataframe back to disk #
-        df.to_csv(str(path), index=False, float_format='%g')
+        # Return the new text #
+        return df.to_csv(index=False, float_format='%g')
 
 ###############################################################################
 if __name__ == '__main__':
-    # Make renamer objects, one per country #
-    renamers = [RenameAssociations(c) for c in continent]
-    # Run them all #
-    for merger in tqdm(renamers):
-        merger()
+    RenameAssociations.run()
@@ -14,16 +14,14 @@ file. Replace '_1' and '_2' with the real classifier names.
 # Built-in modules #
 
 # Third party modules #
-from tqdm import tqdm
 
 # First party modules #
-from autopaths import Path
 
 # Internal modules #
-from libcbm_runner.core.continent import continent
+from libcbm_runner.pump.migration import Migration
 
 ###############################################################################
-class OrigClassifRenamer(object):
+class OrigClassifRenamer(Migration):
     """
     `_1` becomes `forest_type` etc.
     """
@@ -40,32 +38,22 @@ class OrigClassifRenamer(object):
         '_9' : 'growth_period',
     }
 
-    def __init__(self, country):
-        # Default attributes #
-        self.country = country
-
     csv_list = ['events.csv', 'inventory.csv', 'transitions.csv',
                 'growth_curves.csv']
 
-    def __call__(self):
-        for item in self.csv_list:
-            csv_path = Path(self.country.data_dir + 'orig/csv/' + item)
-            self.rename(csv_path)
+    files = ['orig/csv/' + item for item in csv_list]
 
     #------------------------------- Methods ---------------------------------#
-    def rename(self, csv_path):
-        """Loads one CSV files and renames columns."""
-        # Load from disk #
-        header = csv_path.first
+    def convert(self, path, text):
+        """Renames the columns in the header of one CSV file."""
+        # Split the header #
+        header, sep, rest = text.partition('\n')
         header = header.split(',')
         # Modify #
         header = map(self.mapping.get, header, header)
-        # Write to disk #
-        header = ','.join(header)
-        csv_path.remove_first_line()
-        csv_path.prepend(header)
+        # Return the new text #
+        return ','.join(header) + sep + rest
 
 ###############################################################################
 if __name__ == '__main__':
-    renamers = [OrigClassifRenamer(c) for c in continent]
-    for renamer in tqdm(renamers): renamer()
\ No newline at end of file
+    OrigClassifRenamer.run()
\ No newline at end of file
@@ -22,6 +22,7 @@ from autopaths.auto_paths import AutoPaths
 from libcbm_runner                    import libcbm_data_dir
 from libcbm_runner.core.continent     import continent
 from libcbm_runner.pump.pre_processor import PreProcessor
+from libcbm_runner.pump.migration     import Migration
 
 # Constants #
 interface_dir = libcbm_data_dir + 'interface/'
@@ -180,22 +181,7 @@ class MakeActivities(object):
         return str(path)
 
     def add_scen_column(self):
-        # LU was already done previously #
-        if self.country.iso2_code == 'LU': return
-        # The files #
-        files_to_be_modify = ['growth_curves',
-                              'transitions',
-                              'inventory']
-        # Create the four dynamic files #
-        for input_file in files_to_be_modify:
-            # The path to the file that we will modify #
-            path = self.new_paths[input_file]
-            # Read the file #
-            df = pandas.read_csv(str(path))
-            # Add column #
-            df.insert(0, 'scenario', 'reference')
-            # Write output #
-            df.to_csv(str(path), index=False, float_format='%g')
+        return AddScenarioColumn(self.country)()
 
     def restore_header(self):
         """
@@ -223,6 +209,60 @@ class MakeActivities(object):
     def interface_base(self):
         return  self.country_interface_dir + self.country.iso2_code + '_'
 
+    @property
+    def interface_pairs(self):
+        """
+        Every input file with the path of its counterpart in the flat
+        hierarchy of the interface directory.
+        """
+        # Same case for all of: "Common, Silv, Config" #
+        pairs = []
+        for item in self.common_list + self.silv_list + self.config_list:
+            file = self.new_paths[item]
+            pairs.append((file, self.interface_base + 'config_' + file.name))
+        # Different case for "Activities" #
+        for subdir in self.new_paths.activities_dir.flat_directories:
+            act = subdir.name
+            for file in subdir.flat_files:
+                dest = self.interface_base + act + '_' + file.name
+                pairs.append((file, dest))
+        # Return #
+        return pairs
+
+    def link_state(self, file, dest, hardlinks=True):
+        """
+        Compare an input file and its counterpart in the interface with a
+        single `stat` call each, without reading them. Returns one of:
+
+        * 'missing' when there is nothing in the interface.
+        * 'linked'  when the interface still points to the input file.
+        * 'edited'  when the link was replaced by a newer file, typically
+                    because Excel saved it.
+        * 'stale'   otherwise, for instance when the input file was
+                    replaced by a `git checkout`.
+        """
+        # Nothing yet #
+        if not os.path.lexists(str(dest)): return 'missing'
+        source = os.stat(str(file))
+        target = os.lstat(str(dest))
+        # Still the same file #
+        if hardlinks and os.path.samestat(source, target): return 'linked'
+        if not hardlinks and os.path.islink(str(dest)):
+            if os.path.realpath(str(dest)) == os.path.realpath(str(file)):
+                return 'linked'
+        # A regular file modified after the input file #
+        if not os.path.islink(str(dest)) and \
+           target.st_mtime > source.st_mtime: return 'edited'
+        # Return #
+        return 'stale'
+
+    def link(self, file, dest, hardlinks=True, debug=False):
+        """Make one link from the interface to an input file."""
+        dest.remove()
+        if debug: print(str(file), " -> ", str(dest))
+        if hardlinks: os.link(str(file), str(dest))
+        else:                 file.link_to(dest)
+
     def make_interface(self, hardlinks=True, debug=False):
         """
         This method can create symlinks to the input files in a flat hierarchy,
@@ -241,52 +281,75 @@ class MakeActivities(object):
         a temporary file in the same directory, then deletes the original file and
         renames the temporary file to the name of the original file. This destroys
         the hard links upon every save operation.
+
+        Only the links that are missing or stale are made again, and the
+        files that do not match any input file anymore are removed. Files
+        edited through the interface are left untouched until they are
+        copied back with `save_interface`.
         """
         # Create the directory #
         self.country_interface_dir.create_if_not_exists()
-        # Same case for all of: "Common, Silv, Config" #
-        for item in self.common_list + self.silv_list + self.config_list:
-            file = self.new_paths[item]
-            dest = self.interface_base + 'config_' + file.name
+        # Make the links that changed #
+        pairs = self.interface_pairs
+        for file, dest in pairs:
+            state = self.link_state(file, dest, hardlinks)
+            if state in ('missing', 'stale'):
+                self.link(file, dest, hardlinks, debug)
+            elif state == 'edited' and debug:
+                print(str(dest), " was edited, run `save_interface`")
+        # Remove the files of inputs that disappeared #
+        expected = set(str(dest) for file, dest in pairs)
+        for dest in self.country_interface_dir.flat_files:
+            if not str(dest).startswith(str(self.interface_base)): continue
+            if str(dest) in expected: continue
+            if debug: print("Removing ", str(dest))
             dest.remove()
-            if debug: print(str(file), " -> ", str(dest))
-            if hardlinks: os.link(str(file), str(dest))
-            else:                 file.link_to(dest)
-        # Different case for "Activities" #
-        for subdir in self.new_paths.activities_dir.flat_directories:
-            act = subdir.name
-            for file in subdir.flat_files:
-                dest = self.interface_base + act + '_' + file.name
-                dest.remove()
-                if debug: print(str(file), " -> ", str(dest))
-                if hardlinks: os.link(str(file), str(dest))
-                else:                 file.link_to(dest)
         # Return #
         return self.interface_base
 
     #------------------------ Copying files back -----------------------------#
-    def save_interface(self, debug=False):
+    def save_interface(self, hardlinks=True, debug=False):
         """
         In the end, the only way to make this `interface` work is to have a script
         copy every file in the flat hierarchy back to it's expected place within
         the `libcbm_data` repository.
+
+        Only the files edited through the interface are copied back, after
+        which they are linked to the input files again.
         """
-        # Same case for all of: "Common, Silv, Config" #
-        for item in self.common_list + self.silv_list + self.config_list:
-            file = self.new_paths[item]
-            source = self.interface_base + 'config_' + file.name
-            if debug: print(str(source), " -> ", str(file))
-            source.copy_to(file)
-        # Different case for "Activities" #
-        for subdir in self.new_paths.activities_dir.flat_directories:
-            act = subdir.name
-            for file in subdir.flat_files:
-                source = self.interface_base + act + '_' + file.name
-                if debug: print(str(source), " -> ", str(file))
-                source.copy_to(file)
+        # Find the edited files first #
+        edited = [(file, dest) for file, dest in self.interface_pairs
+                  if self.link_state(file, dest, hardlinks) == 'edited']
+        # Copy them back and link them again #
+        for file, dest in edited:
+            if debug: print(str(dest), " -> ", str(file))
+            dest.copy(file)
+            self.link(file, dest, hardlinks)
         # Return #
         return self.interface_base
 
+###############################################################################
+class AddScenarioColumn(Migration):
+    """
+    Adds the `scenario` column, with the value 'reference', in front of the
+    dynamic files of the management activity. Files that already have the
+    column are left as they are, so this can be run again safely.
+    """
+
+    files = ['activities/mgmt/growth_curves.csv',
+             'activities/mgmt/transitions.csv',
+             'activities/mgmt/inventory.csv']
+
+    def convert(self, path, text):
+        # Already done #
+        if text.startswith('scenario,'): return text
+        # Work on the lines to keep the repeated names of transitions #
+        lines = text.splitlines(keepends=True)
+        first = ['scenario,' + lines[0]] if lines else []
+        rest  = ['reference,' + l if l.strip() else l for l in lines[1:]]
+        # Return #
+        return ''.join(first + rest)
+
 ###############################################################################
 makers = [MakeActivities(c) for c in continent]
 if __name__ == '__main__': print([maker() for maker in tqdm(makers)])
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Written by Lucas Sinclair and Paul Rougieux.
+
+JRC Biomass Project.
+Unit D1 Bioeconomy.
+
+Typically you would run this file from a command line like this:
+
+     ipython3 -i -- ~/deploy/libcbm_runner/scripts/setup/synthetic_countries.py /tmp/scratch/
+
+Writes a series of synthetic countries of increasing size in the scratch
+directory given, to benchmark the runner or test memory limits. Then set
+the `LIBCBM_DATA` environment variable to that directory to run them.
+"""
+
+# Built-in modules #
+import sys
+
+# Internal modules #
+from libcbm_runner.info.synthetic import SyntheticCountry
+
+# The scratch directory must be given explicitly #
+if len(sys.argv) != 2:
+    sys.exit("Usage: synthetic_countries.py <scratch_data_dir>")
+scratch_dir = sys.argv[1]
+
+# The sizes to sweep, as country code and number of inventory rows #
+sizes = {'ZS': 1000, 'ZM': 10000, 'ZL': 100000, 'ZX': 1000000}
+
+# Write every country with the same seed #
+for code, rows in sizes.items():
+    country = SyntheticCountry(code, inventory_rows=rows, event_rows=rows//50,
+                               seed=0)
+    print(country.write(scratch_dir))
@@ -33,6 +33,8 @@ setup(
                         'tqdm', 'p_tqdm'],
     extras_require   = {'extras': ['pystache', 'matplotlib', 'numexpr']},
     python_requires  = ">=3.8,!=3.10.*",
+    entry_points     = {'console_scripts':
+                        ['libcbm-runner = libcbm_runner.cli:main']},
     long_description = readme,
     long_description_content_type = 'text/markdown',
     include_package_data = True,